@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""bench_backends.py: Compare the MoteXML codec backends."""
+from __future__ import print_function
+
+from codecs import decode
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Run from a checkout, the motexml package and the benchmark modules are imported from it
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from motexml import mle
+from motexml.motexml import MoteXMLTranslator
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+PACKET = decode(b'080F4A010FE2004A02044D9549036EFE49010F364A05044F0D49066EFD'
+                b'4901590A090502C809D20800000000000000004A09087C21C8092210F0'
+                b'63C751A8D44673AF386DF82A9BB942', 'hex')
+
+
+def bench(backend, types, number):
+    trans = MoteXMLTranslator(types, backend=backend)
+    element = trans.translate_to_xml(PACKET)
+    plan = trans.compile_template(element, {"seq": "dt_subscription/dt_seq"})
+
+    results = []
+    for name, stmt in (("translate_to_xml", lambda: trans.translate_to_xml(PACKET)),
+                       ("translate_from_xml", lambda: trans.translate_from_xml(element)),
+                       ("template encode", lambda: plan.encode(seq=8571))):
+        best = min(timeit.repeat(stmt, number=number, repeat=5))
+        results.append((name, best / number * 1e6))
+    return results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="MoteXML backend benchmark")
+    parser.add_argument("--types", default=os.path.join(os.path.dirname(__file__), "..", "motexml", "tests", "dt_types.txt"),
+                        help="dt_types text file")
+    parser.add_argument("--number", default=2000, type=int, help="Iterations per measurement")
+    args = parser.parse_args()
+
+    for backend in mle.BACKENDS:
+        try:
+            mle.load_backend(backend)
+        except OSError as e:
+            print("{:8s} unavailable: {}".format(backend, e))
+            continue
+
+        for name, usec in bench(backend, args.types, args.number):
+            print("{:8s} {:20s} {:8.2f} us/packet".format(backend, name, usec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""bench_ctypes.py: Per-call cost of libmlformat calls with and without declared prototypes."""
+from __future__ import print_function
+
+import ctypes
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Run from a checkout, the motexml package is imported from it
+sys.path.insert(0, ROOT)
+
+from motexml import mlctypes
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="libmlformat per-call benchmark")
+    parser.add_argument("--number", default=200000, type=int, help="Calls per measurement")
+    args = parser.parse_args()
+
+    # A separate handle without prototypes, every call looks the function up and converts arguments generically
+    raw = ctypes.CDLL(mlctypes.libname)
+    cobject = ctypes.create_string_buffer(mlctypes.MLO_OBJECT_SIZE)
+    address = ctypes.addressof(cobject)
+
+    cases = (
+        ("MLO_objectSize", lambda: raw.MLO_objectSize(), lambda: mlctypes.MLO_OBJECT_SIZE),
+        ("MLO_setValue", lambda: raw.MLO_setValue(cobject, 1000), lambda: mlctypes.MLO_setValue(address, 1000)),
+        ("MLO_getValue", lambda: raw.MLO_getValue(cobject), lambda: mlctypes.MLO_getValue(address)),
+        ("MLO_getType", lambda: raw.MLO_getType(cobject), lambda: mlctypes.MLO_getType(address)),
+    )
+
+    print("{:24s} {:>10s} {:>10s}".format("function", "before ns", "after ns"))
+    for name, before, after in cases:
+        b = min(timeit.repeat(before, number=args.number, repeat=5)) / args.number * 1e9
+        a = min(timeit.repeat(after, number=args.number, repeat=5)) / args.number * 1e9
+        print("{:24s} {:10.1f} {:10.1f}".format(name, b, a))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""bench_parallel.py: Throughput of ParallelTranslator with threads and processes."""
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Run from a checkout, the motexml package and the benchmark modules are imported from it
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from motexml import mle
+from motexml.motexml import MoteXMLTranslator
+from motexml.parallel import ParallelTranslator
+
+from bench_backends import PACKET
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+def iterate(backend, count):
+    """Only walk the objects, the part of decoding done in the codec."""
+    module = mle.load_backend(backend)
+    for _ in range(count):
+        iterator = module.MLI(PACKET, copy=False)
+        while iterator.next() is not None:
+            pass
+        iterator.close()
+
+
+def bench_iterate(backend, threads, count):
+    workers = [threading.Thread(target=iterate, args=(backend, count // threads)) for _ in range(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return count / (time.time() - start)
+
+
+def bench_translate(types, backend, workers, processes, count):
+    packets = [PACKET] * count
+    if workers == 0:
+        translator = MoteXMLTranslator(types, backend=backend)
+        start = time.time()
+        for packet in packets:
+            translator.translate_to_xml(packet)
+        return count / (time.time() - start)
+
+    with ParallelTranslator(types, backend=backend, workers=workers, processes=processes) as parallel:
+        list(parallel.translate_to_xml(packets[:workers * parallel.batch]))  # Start the workers
+        start = time.time()
+        for _ in parallel.translate_to_xml(packets):
+            pass
+        return count / (time.time() - start)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="MoteXML parallel decoding benchmark")
+    parser.add_argument("--types", default=os.path.join(os.path.dirname(__file__), "..", "motexml", "tests", "dt_types.txt"),
+                        help="dt_types text file")
+    parser.add_argument("--number", default=20000, type=int, help="Packets per measurement")
+    parser.add_argument("--workers", default=os.cpu_count() or 1, type=int, help="Threads or processes")
+    args = parser.parse_args()
+
+    print("{} CPUs".format(os.cpu_count()))
+    for backend in mle.BACKENDS:
+        try:
+            mle.load_backend(backend)
+        except OSError as e:
+            print("{:8s} unavailable: {}".format(backend, e))
+            continue
+
+        for threads in sorted({1, args.workers}):
+            print("{:8s} iterate {:2d} threads          {:10.0f} packets/s".format(
+                backend, threads, bench_iterate(backend, threads, args.number)))
+        print("{:8s} translate_to_xml sequential  {:10.0f} packets/s".format(
+            backend, bench_translate(args.types, backend, 0, False, args.number)))
+        for processes in (False, True):
+            print("{:8s} translate_to_xml {:2d} {:9s} {:10.0f} packets/s".format(
+                backend, args.workers, "processes" if processes else "threads",
+                bench_translate(args.types, backend, args.workers, processes, args.number)))
+
+
+if __name__ == '__main__':
+    main()
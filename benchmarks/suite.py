@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""suite.py: MoteXML benchmark suite on synthetic packets, with results saved as JSON for comparison."""
+from __future__ import print_function
+
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Run from a checkout, the motexml package and the benchmark modules are imported from it
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+import motexml
+from motexml import framing
+from motexml import mle
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+
+from synthetic import DT_TYPES, generate_packets
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+def packet_objects(module, packet):
+    objects = []
+    iterator = module.MLI(packet)
+    obj = iterator.next()
+    while obj is not None:
+        objects.append((obj.type, obj.subject, obj.value if obj.valueIsPresent else None,
+                        obj.getBuffer() if obj.bufferLength > 0 else None))
+        obj = iterator.next()
+    return objects
+
+
+def iterate(module, packet):
+    iterator = module.MLI(packet, copy=False)
+    while iterator.next() is not None:
+        pass
+    iterator.close()
+
+
+def encode(module, objects):
+    encoder = module.MLE(4096)
+    encoder.append_many(objects)
+    return encoder.str()
+
+
+def cases(backend, elements):
+    """Yield (name, function) pairs, every function processes all the packets once."""
+    trans = MoteXMLTranslator(DT_TYPES, backend=backend)
+    module = mle.load_backend(backend)
+    packets = [trans.translate_from_xml(e) for e in elements]
+    objects = [packet_objects(module, p) for p in packets]
+
+    yield "translate_from_xml", lambda: [trans.translate_from_xml(e) for e in elements]
+    yield "translate_to_xml", lambda: [trans.translate_to_xml(p) for p in packets]
+    yield "xml_to_string", lambda: [xml_to_string(e) for e in elements]
+    yield "xml_to_string compact", lambda: [xml_to_string(e, None) for e in elements]
+    yield "MLE append_many", lambda: [encode(module, o) for o in objects]
+    yield "MLI iterate", lambda: [iterate(module, p) for p in packets]
+
+
+def run_tool(args, data, env):
+    start = time.time()
+    subprocess.run([sys.executable, "-m"] + args, input=data, stdout=subprocess.DEVNULL, check=True, env=env)
+    return time.time() - start
+
+
+def bench_tools(backend, elements, repeat):
+    """Time the command line tools in stream mode, process startup included."""
+    trans = MoteXMLTranslator(DT_TYPES, backend=backend)
+    binary = io.BytesIO()
+    for element in elements:
+        framing.write_length_prefixed(binary, trans.translate_from_xml(element))
+    document = b"<packets>" + b"".join(xml_to_string(e, None).encode("utf-8").split(b"?>", 1)[1]
+                                       for e in elements) + b"</packets>"
+
+    env = dict(os.environ, MOTEXML_BACKEND=backend, PYTHONPATH=ROOT)
+    with tempfile.TemporaryDirectory() as cache:
+        env["MOTEXML_CACHE_DIR"] = cache
+        for name, args, data in (
+                ("mlhextoxml --stream", ["motexml.tools.mlhextoxml", "--stream", "--format", "binary",
+                                         "--types", DT_TYPES], binary.getvalue()),
+                ("xmltomlhex --stream", ["motexml.tools.xmltomlhex", "--stream", "--format", "binary",
+                                         "--types", DT_TYPES], document)):
+            yield name, min(run_tool(args, data, env) for _ in range(repeat))
+
+
+def run(args):
+    elements = generate_packets(args.packets, seed=args.seed, objects=args.objects, depth=args.depth,
+                                fanout=args.fanout, buffer_size=args.buffer_size)
+    results = {}
+    for backend in mle.BACKENDS:
+        try:
+            mle.load_backend(backend)
+        except OSError as e:
+            print("{:8s} unavailable: {}".format(backend, e), file=sys.stderr)
+            continue
+
+        for name, function in cases(backend, elements):
+            best = min(timeit.repeat(function, number=args.number, repeat=args.repeat))
+            results["{} {}".format(backend, name)] = best / args.number / len(elements) * 1e6
+        if args.tools:
+            for name, seconds in bench_tools(backend, elements, args.repeat):
+                results["{} {}".format(backend, name)] = seconds / len(elements) * 1e6
+
+    return {
+        "motexml": motexml.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "parameters": {"packets": args.packets, "seed": args.seed, "objects": args.objects, "depth": args.depth,
+                       "fanout": args.fanout, "buffer_size": args.buffer_size},
+        "unit": "us/packet",
+        "results": results,
+    }
+
+
+def differences(report, baseline, keys):
+    """Return the keys of the report that have different values in the baseline."""
+    return [key for key in keys if report.get(key) != baseline.get(key)]
+
+
+def compare(report, baseline, threshold):
+    """Print the change against a baseline report, returns the number of results slower than threshold."""
+    slower = 0
+    for name, usec in sorted(report["results"].items()):
+        before = baseline["results"].get(name)
+        if before is None:
+            print("{:36s} {:10.2f}".format(name, usec))
+            continue
+        change = usec / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "SLOWER"
+            slower += 1
+        print("{:36s} {:10.2f} {:10.2f} {:+7.1%} {}".format(name, before, usec, change, flag))
+    return slower
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="MoteXML benchmark suite")
+    parser.add_argument("--packets", default=50, type=int, help="Number of synthetic packets")
+    parser.add_argument("--seed", default=1, type=int, help="Packet generator seed")
+    parser.add_argument("--objects", default=32, type=int, help="Maximum objects per packet")
+    parser.add_argument("--depth", default=3, type=int, help="Maximum nesting depth")
+    parser.add_argument("--fanout", default=4, type=int, help="Children per element")
+    parser.add_argument("--buffer-size", default=0, type=int, help="Buffer bytes on a quarter of the objects")
+    parser.add_argument("--number", default=20, type=int, help="Passes over the packets per measurement")
+    parser.add_argument("--repeat", default=5, type=int, help="Measurements, the best one is reported")
+    parser.add_argument("--tools", default=False, action="store_true", help="Also time the command line tools")
+    parser.add_argument("--output", default=None, help="Save the results as JSON")
+    parser.add_argument("--compare", default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", default=0.1, type=float,
+                        help="Relative slowdown reported as a regression, exit status is 1 if there are any. "
+                             "Exit status is 2 if the baseline was run with different parameters")
+    args = parser.parse_args()
+
+    if args.buffer_size > 255:
+        parser.error("buffers can not be longer than 255 bytes")
+
+    report = run(args)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        # Results of different packets can't be compared, other interpreters and machines can with care
+        if differences(report, baseline, ("parameters",)):
+            print("{} was run with different parameters: {}".format(args.compare, baseline.get("parameters")),
+                  file=sys.stderr)
+            sys.exit(2)
+        for key in differences(report, baseline, ("python", "platform")):
+            print("warning: {} was run on {} {}".format(args.compare, key, baseline.get(key)), file=sys.stderr)
+        if compare(report, baseline, args.threshold) > 0:
+            sys.exit(1)
+    else:
+        for name, usec in sorted(report["results"].items()):
+            print("{:36s} {:10.2f} {}".format(name, usec, report["unit"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""synthetic.py: Synthetic MoteXML packets for the benchmarks."""
+from codecs import encode
+import os
+import random
+from xml.etree import ElementTree
+
+from motexml.tagdb import TagDatabase
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+DT_TYPES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dt_types.txt")
+
+
+def generate_packet(tagdb, objects=32, depth=3, fanout=4, buffer_size=0, buffer_ratio=0.25, rnd=random):
+    """
+    Generate an xml_packet element of up to objects elements, filled breadth-first with fanout children per
+    element down to depth levels. buffer_ratio of the elements get a buffer of buffer_size random bytes.
+    Values are spread over all integer widths, dt_types values name another tag.
+    """
+    tags = sorted(name for code, name in tagdb.names.items() if code != 0)
+    root = ElementTree.Element("xml_packet")
+    level = [root]
+    count = 0
+    for _ in range(depth):
+        parents, level = level, []
+        for parent in parents:
+            for _ in range(fanout):
+                if count >= objects:
+                    return root
+                tag = rnd.choice(tags)
+                element = ElementTree.SubElement(parent, tag)
+                if tagdb.reprs.get(tagdb.codes[tag]) == "dt_types":
+                    element.set("value", rnd.choice(tags))
+                else:
+                    bits = rnd.choice((7, 15, 31))
+                    element.set("value", str(rnd.randint(-2 ** bits, 2 ** bits - 1)))
+                if buffer_size > 0 and rnd.random() < buffer_ratio:
+                    data = bytes(rnd.getrandbits(8) for _ in range(buffer_size))
+                    element.set("buffer", encode(data, "hex").decode("ascii").upper())
+                level.append(element)
+                count += 1
+    return root
+
+
+def generate_packets(count, tagdb=None, seed=1, **kwargs):
+    """Generate count packets deterministically for seed, see generate_packet for the arguments."""
+    if tagdb is None:
+        tagdb = TagDatabase.from_file(DT_TYPES)
+    rnd = random.Random(seed)
+    return [generate_packet(tagdb, rnd=rnd, **kwargs) for _ in range(count)]
@@ -0,0 +1,98 @@
+"""aio.py: asyncio packet streams.
+
+The asyncio counterparts of the framing module, for decoding packets from many connections in one event loop:
+
+    reader, writer = await asyncio.open_connection(host, port)
+    async for element in decode_stream(reader, translator.translate_to_xml, "binary"):
+        ...
+
+Frames are read only as fast as the consumer takes the results, so a slow consumer stops reading from the
+connection and the transport's flow control pushes back on the sender.
+"""
+import asyncio
+from codecs import decode
+from collections import deque
+
+from motexml.framing import LENGTH_PREFIX
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+async def read_length_prefixed(reader):
+    """
+    Yield packets from a binary length-prefixed stream, see framing.read_length_prefixed.
+    """
+    while True:
+        try:
+            header = await reader.readexactly(LENGTH_PREFIX.size)
+        except asyncio.IncompleteReadError as e:
+            if e.partial:
+                raise ValueError("stream ends in the middle of a length prefix")
+            return
+        length, = LENGTH_PREFIX.unpack(header)
+        try:
+            yield await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ValueError("stream ends in the middle of a %u byte packet" % length)
+
+
+async def read_hex_lines(reader):
+    """
+    Yield packets from newline-delimited hex, see framing.read_hex_lines.
+    """
+    lnum = 0
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        lnum += 1
+        line = line.strip()
+        if line and not line.startswith(b"#"):
+            try:
+                yield decode(line, "hex")
+            except ValueError:
+                raise ValueError("line %u: \"%s\" is not hex" % (lnum, line.decode("ascii", "replace")))
+
+
+async def write_length_prefixed(writer, packet):
+    writer.write(LENGTH_PREFIX.pack(len(packet)) + bytes(packet))
+    await writer.drain()
+
+
+FRAMINGS = {
+    "binary": read_length_prefixed,
+    "hex": read_hex_lines,
+}
+
+
+async def decode_stream(reader, function, framing="binary", executor=None, concurrency=1):
+    """
+    Yield function(packet) for every packet read from the StreamReader, in order. function is usually a translator
+    method such as translate_to_xml. framing is a name from FRAMINGS or an async generator function that takes
+    the reader and yields packets.
+
+    With an executor (see loop.run_in_executor) the calls are made in the executor, up to concurrency of them at
+    a time. A shared translator may be used from a thread pool; a process pool needs a picklable module-level
+    function with a translator of its own in every worker.
+    """
+    if not callable(framing):
+        framing = FRAMINGS[framing]
+
+    if executor is None:
+        async for packet in framing(reader):
+            yield function(packet)
+        return
+
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    try:
+        async for packet in framing(reader):
+            pending.append(loop.run_in_executor(executor, function, packet))
+            if len(pending) >= concurrency:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,270 @@
+"""archive.py: Append-only packet capture archives.
+
+An archive is two files. The data file is a plain length-prefixed packet stream (see framing), so the tools can
+read it with --format binary. The index file, the data file name with ".idx" appended, starts with INDEX_MAGIC and
+has a record per packet: the offset of the packet in the data file (uint64), its timestamp (double, seconds since
+the epoch) and the number of its top-level type codes (uint16) followed by the codes (uint32), all little-endian.
+
+Archives are read through mmap, packets are memoryviews of the mapping that can be given to the translator
+directly:
+
+    with Archive("capture.mla") as archive:
+        for timestamp, packet in archive.find(0x0F):
+            element = translator.translate_to_xml(packet)
+"""
+from array import array
+import mmap
+import os
+import struct
+import time
+
+from motexml.framing import LENGTH_PREFIX, read_length_prefixed
+from motexml.mlpure import decode_object
+
+import logging
+log = logging.getLogger(__name__)
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+INDEX_MAGIC = b"MLXI0001"
+INDEX_RECORD = struct.Struct("<QdH")
+INDEX_TYPE = struct.Struct("<I")
+
+MAX_PACKET = 0xFFFF
+
+# Index records kept in memory before the writer flushes, at most INDEX_PENDING of them for at most INDEX_INTERVAL
+# seconds
+INDEX_PENDING = 1024
+INDEX_INTERVAL = 1.0
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def top_level_types(packet):
+    """Return the sorted type codes of the objects without a subject, undecodable data ends the packet."""
+    types = set()
+    offset = 0
+    decoded = decode_object(packet, offset)
+    while decoded is not None:
+        if decoded[1] == 0:
+            types.add(decoded[0])
+        offset = decoded[6]
+        decoded = decode_object(packet, offset)
+    return sorted(types)
+
+
+def _map_data(f):
+    """Return (mmap, memoryview) of a data file, the mmap is None if the file is empty."""
+    size = os.fstat(f.fileno()).st_size
+    if size > 0:
+        m = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        return m, memoryview(m)
+    return None, memoryview(b"")
+
+
+def _read_index(f, data):
+    """
+    Return (offsets, timestamps, types, size) of the records in an index file, size is the length of the records
+    returned. The index ends at a truncated record or at the first one whose packet is not entirely in data, the
+    contents of the data file.
+    """
+    offsets = array("Q")
+    timestamps = array("d")
+    types = []
+    index = f.read()
+    if index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        raise ValueError("%s is not a packet archive index" % f.name)
+
+    pos = len(INDEX_MAGIC)
+    while pos + INDEX_RECORD.size <= len(index):
+        offset, timestamp, count = INDEX_RECORD.unpack_from(index, pos)
+        end = pos + INDEX_RECORD.size + count * INDEX_TYPE.size
+        if end > len(index):
+            break
+        if offset + LENGTH_PREFIX.size > len(data):
+            break
+        length, = LENGTH_PREFIX.unpack_from(data, offset)
+        if offset + LENGTH_PREFIX.size + length > len(data):
+            break
+        offsets.append(offset)
+        timestamps.append(timestamp)
+        types.append(frozenset(struct.unpack_from("<%uI" % count, index, pos + INDEX_RECORD.size)))
+        pos = end
+    return offsets, timestamps, types, pos
+
+
+def _index_packets(data, offset, index):
+    """
+    Write index records, with the timestamps set to 0, for the packets of the data file from its current position,
+    which is offset. Returns the number of packets indexed and the offset after the last complete packet.
+    """
+    count = 0
+    try:
+        for packet in read_length_prefixed(data):
+            types = top_level_types(packet)
+            index.write(INDEX_RECORD.pack(offset, 0.0, len(types)))
+            index.write(struct.pack("<%uI" % len(types), *types))
+            offset += LENGTH_PREFIX.size + len(packet)
+            count += 1
+    except ValueError as e:
+        log.warning("%s: %s after %u packets", data.name, e, count)
+    return count, offset
+
+
+def rebuild_index(path):
+    """Write a new index for the data file, the timestamps are 0. Returns the number of packets indexed."""
+    with open(path, "rb") as data, open(index_path(path), "wb") as index:
+        index.write(INDEX_MAGIC)
+        count, _ = _index_packets(data, 0, index)
+    return count
+
+
+class ArchiveWriter(object):
+    """
+    Append packets to an archive, creating it if needed. Index records are written when the writer is flushed,
+    after the data they point to, at the latest after INDEX_PENDING packets or INDEX_INTERVAL seconds. When the
+    archive is opened, packets in the data file past the index, left by a writer that did not finish, are indexed
+    with the timestamps set to 0, a partial packet at the end is dropped, and so are index records whose packets
+    are missing from the data file. A missing index is rebuilt from the data file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        ipath = index_path(path)
+        if not os.path.exists(ipath):
+            with open(ipath, "wb") as f:
+                f.write(INDEX_MAGIC)
+
+        offsets, size, self._offset = (), len(INDEX_MAGIC), 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                m, data = _map_data(f)
+                try:
+                    with open(ipath, "rb") as index:
+                        offsets, _, _, size = _read_index(index, data)
+                    if offsets:
+                        length, = LENGTH_PREFIX.unpack_from(data, offsets[-1])
+                        self._offset = offsets[-1] + LENGTH_PREFIX.size + length
+                finally:
+                    data.release()
+                    if m is not None:
+                        m.close()
+        self._count = len(offsets)
+
+        self._index = open(ipath, "r+b")
+        if os.path.getsize(ipath) != size:
+            log.warning("%s: dropping index records past the data", path)
+            self._index.truncate(size)
+        self._index.seek(size)
+        if os.path.exists(path):
+            with open(path, "rb") as data:
+                data.seek(self._offset)
+                count, self._offset = _index_packets(data, self._offset, self._index)
+            if count > 0:
+                log.warning("%s: indexed %u packets missing from the index", path, count)
+                self._count += count
+            self._index.flush()
+
+        self._data = open(path, "ab" if os.path.exists(path) else "wb")
+        if self._data.tell() != self._offset:
+            log.warning("%s: dropping a partial packet of %u bytes", path, self._data.tell() - self._offset)
+            self._data.truncate(self._offset)
+        self._pending = []
+        self._flushed = time.monotonic()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, packet, timestamp=None):
+        """Append a packet, by default timestamped now. Returns the number of the packet in the archive."""
+        if len(packet) > MAX_PACKET:
+            raise ValueError("packet of %u bytes is too long" % len(packet))
+        if timestamp is None:
+            timestamp = time.time()
+        types = top_level_types(packet)
+
+        self._data.write(LENGTH_PREFIX.pack(len(packet)))
+        self._data.write(packet)
+        self._pending.append(INDEX_RECORD.pack(self._offset, timestamp, len(types)))
+        self._pending.append(struct.pack("<%uI" % len(types), *types))
+        self._offset += LENGTH_PREFIX.size + len(packet)
+        self._count += 1
+        if len(self._pending) >= 2 * INDEX_PENDING or time.monotonic() - self._flushed >= INDEX_INTERVAL:
+            self.flush()
+        return self._count - 1
+
+    def flush(self):
+        # Data first, the index must never point past the data
+        self._data.flush()
+        self._index.write(b"".join(self._pending))
+        self._pending = []
+        self._index.flush()
+        self._flushed = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Archive(object):
+    """
+    Read an archive through mmap, as it was when opened. Packets are memoryviews of the mapping, they must be
+    released before the archive is closed. Index records of packets that are not in the mapped data are ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map, self._view = _map_data(self._file)
+        try:
+            with open(index_path(path), "rb") as f:
+                self.offsets, self.timestamps, self.types, _ = _read_index(f, self._view)
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        """The packet number i as a memoryview."""
+        start = self.offsets[i] + LENGTH_PREFIX.size
+        length, = LENGTH_PREFIX.unpack_from(self._view, self.offsets[i])
+        return self._view[start:start + length]
+
+    def scan(self, start=None, end=None):
+        """Yield (timestamp, packet) for the packets with start <= timestamp < end, either may be None."""
+        for i, timestamp in enumerate(self.timestamps):
+            if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                yield timestamp, self[i]
+
+    def find(self, type, start=None, end=None):
+        """Yield (timestamp, packet) for the packets with a top-level object of type, see scan for the times."""
+        for i, types in enumerate(self.types):
+            if type in types:
+                timestamp = self.timestamps[i]
+                if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    yield timestamp, self[i]
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
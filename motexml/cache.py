@@ -0,0 +1,97 @@
+"""cache.py: Bounded result cache for translators."""
+from collections import OrderedDict
+import threading
+from xml.etree import ElementTree
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+_MISSING = object()
+
+# Approximate memory of a frozen tree node besides its strings: the node and children tuples and string headers
+NODE_SIZE = 160
+
+
+class LRUCache(object):
+    """
+    A least recently used cache of at most entries items and, if size is given, items of a total size of at most
+    size (as given to put). Safe to use from several threads.
+    """
+
+    def __init__(self, entries=1024, size=None):
+        self.entries = entries
+        self.size = size
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size=0):
+        if self.size is not None and size > self.size:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._data[key] = (value, size)
+            self._size += size
+            while len(self._data) > self.entries or (self.size is not None and self._size > self.size):
+                self._size -= self._data.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def info(self):
+        """Return a dict of the hits, misses, evictions, entries and size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._data), "size": self._size}
+
+
+def freeze_tree(element):
+    """Return an immutable (tag, value, buffer, children) form of a translated tree, see thaw_tree."""
+    return element.tag, element.get("value"), element.get("buffer"), tuple(freeze_tree(c) for c in element)
+
+
+def frozen_size(frozen):
+    """Return an estimate of the memory used by a tree in the form returned by freeze_tree, in bytes."""
+    tag, value, buffer, children = frozen
+    size = NODE_SIZE + len(value or "") + len(buffer or "")
+    for c in children:
+        size += frozen_size(c)
+    return size
+
+
+def thaw_tree(frozen, parent=None):
+    """Build a new tree from the form returned by freeze_tree."""
+    tag, value, buffer, children = frozen
+    if parent is None:
+        element = ElementTree.Element(tag)
+    else:
+        element = ElementTree.SubElement(parent, tag)
+    if value is not None:
+        element.set("value", value)
+    if buffer is not None:
+        element.set("buffer", buffer)
+    for c in children:
+        thaw_tree(c, element)
+    return element
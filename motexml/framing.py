@@ -0,0 +1,44 @@
+"""framing.py: MoteXML packet stream framing."""
+from codecs import decode
+import struct
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+# Binary streams precede every packet with its length as a big-endian uint16
+LENGTH_PREFIX = struct.Struct(">H")
+
+
+def read_hex_lines(f):
+    """
+    Yield packets from newline-delimited hex, empty lines and lines starting with # are skipped.
+    """
+    for lnum, line in enumerate(f, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            try:
+                yield decode(line, "hex")
+            except ValueError:
+                raise ValueError("line %u: \"%s\" is not hex" % (lnum, line))
+
+
+def read_length_prefixed(f):
+    """
+    Yield packets from a binary length-prefixed stream.
+    """
+    while True:
+        header = f.read(LENGTH_PREFIX.size)
+        if len(header) < LENGTH_PREFIX.size:
+            if header:
+                raise ValueError("stream ends in the middle of a length prefix")
+            return
+        length, = LENGTH_PREFIX.unpack(header)
+        data = f.read(length)
+        if len(data) < length:
+            raise ValueError("stream ends in the middle of a %u byte packet" % length)
+        yield data
+
+
+def write_length_prefixed(f, packet):
+    f.write(LENGTH_PREFIX.pack(len(packet)))
+    f.write(packet)
@@ -0,0 +1,322 @@
+"""mlctypes.py: MoteXML encoder and iterator, libmlformat backend."""
+from array import array
+import ctypes
+from itertools import repeat
+
+from motexml.mlo import MLObject, int32
+from motexml.mlpure import ML_MAX_BUFFER, ML_MAX_SUBJECT
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+name = "ctypes"
+
+libname = "libmlformat.so"
+lib = ctypes.cdll.LoadLibrary(libname)
+
+_vp = ctypes.c_void_p
+_int = ctypes.c_int
+
+# name: (restype, argtypes)
+_PROTOTYPES = {
+    "MLE_encoderSize": (_int, ()),
+    "MLE_initialize": (_int, (_vp, _vp, _int)),
+    "MLE_appendObject": (_int, (_vp, _vp)),
+    "MLE_appendOSV": (_int, (_vp, ctypes.c_uint32, _int, ctypes.c_int32)),
+    "MLE_appendOS": (_int, (_vp, ctypes.c_uint32, _int)),
+    "MLE_finalize": (_int, (_vp,)),
+    "MLI_iteratorSize": (_int, ()),
+    "MLI_initialize": (_int, (_vp, _vp, _int)),
+    "MLI_next": (_int, (_vp, _vp)),
+    "MLI_nextWithSubject": (_int, (_vp, _int, _vp)),
+    "MLI_reset": (_int, (_vp,)),
+    "MLO_objectSize": (_int, ()),
+    "MLO_getIndex": (_int, (_vp,)),
+    "MLO_getType": (ctypes.c_uint32, (_vp,)),
+    "MLO_getValue": (ctypes.c_int32, (_vp,)),
+    "MLO_getValueIsPresent": (ctypes.c_bool, (_vp,)),
+    "MLO_getSubject": (_int, (_vp,)),
+    "MLO_getBufferLength": (_int, (_vp,)),
+    "MLO_getBuffer": (_vp, (_vp,)),
+    "MLO_setType": (None, (_vp, ctypes.c_uint32)),
+    "MLO_setSubject": (None, (_vp, _int)),
+    "MLO_setValue": (None, (_vp, ctypes.c_int32)),
+    "MLO_setValueIsPresent": (None, (_vp, ctypes.c_bool)),
+    "MLO_setBuffer": (None, (_vp, _vp, _int)),
+}
+
+for _name, (_restype, _argtypes) in _PROTOTYPES.items():
+    _function = getattr(lib, _name)
+    _function.restype = _restype
+    _function.argtypes = _argtypes
+
+# Pre-resolved function pointers, lib.<name> is an attribute lookup on every call. Struct pointers are passed
+# as plain integer addresses, those are the cheapest to convert to c_void_p.
+MLE_initialize = lib.MLE_initialize
+MLE_appendObject = lib.MLE_appendObject
+MLE_appendOSV = lib.MLE_appendOSV
+MLE_appendOS = lib.MLE_appendOS
+MLE_finalize = lib.MLE_finalize
+MLI_initialize = lib.MLI_initialize
+MLI_next = lib.MLI_next
+MLI_nextWithSubject = lib.MLI_nextWithSubject
+MLI_reset = lib.MLI_reset
+MLO_getIndex = lib.MLO_getIndex
+MLO_getType = lib.MLO_getType
+MLO_getValue = lib.MLO_getValue
+MLO_getValueIsPresent = lib.MLO_getValueIsPresent
+MLO_getSubject = lib.MLO_getSubject
+MLO_getBufferLength = lib.MLO_getBufferLength
+MLO_getBuffer = lib.MLO_getBuffer
+MLO_setType = lib.MLO_setType
+MLO_setSubject = lib.MLO_setSubject
+MLO_setValue = lib.MLO_setValue
+MLO_setValueIsPresent = lib.MLO_setValueIsPresent
+MLO_setBuffer = lib.MLO_setBuffer
+
+MLE_ENCODER_SIZE = lib.MLE_encoderSize()
+MLI_ITERATOR_SIZE = lib.MLI_iteratorSize()
+MLO_OBJECT_SIZE = lib.MLO_objectSize()
+
+
+class _Py_buffer(ctypes.Structure):
+    _fields_ = [("buf", ctypes.c_void_p),
+                ("obj", ctypes.py_object),
+                ("len", ctypes.c_ssize_t),
+                ("itemsize", ctypes.c_ssize_t),
+                ("readonly", ctypes.c_int),
+                ("ndim", ctypes.c_int),
+                ("format", ctypes.c_char_p),
+                ("shape", ctypes.POINTER(ctypes.c_ssize_t)),
+                ("strides", ctypes.POINTER(ctypes.c_ssize_t)),
+                ("suboffsets", ctypes.POINTER(ctypes.c_ssize_t)),
+                ("internal", ctypes.c_void_p)]
+
+
+_PyBUF_SIMPLE = 0
+_PyObject_GetBuffer = ctypes.pythonapi.PyObject_GetBuffer
+_PyObject_GetBuffer.argtypes = (ctypes.py_object, ctypes.POINTER(_Py_buffer), ctypes.c_int)
+_PyObject_GetBuffer.restype = ctypes.c_int
+_PyBuffer_Release = ctypes.pythonapi.PyBuffer_Release
+_PyBuffer_Release.argtypes = (ctypes.POINTER(_Py_buffer),)
+_PyBuffer_Release.restype = None
+
+
+def _mlobject(cobject, base, view=None):
+    """
+    Read the C object, base is the address of the packet. The buffer is a memoryview slice of view if given,
+    otherwise a copy.
+    """
+    mlobject = MLObject()
+    mlobject.index = MLO_getIndex(cobject)
+    mlobject.type = MLO_getType(cobject)
+    mlobject.value = MLO_getValue(cobject)
+    mlobject.valueIsPresent = MLO_getValueIsPresent(cobject)
+    mlobject.subject = MLO_getSubject(cobject)
+    length = mlobject.bufferLength = MLO_getBufferLength(cobject)
+    if length > 0:
+        address = MLO_getBuffer(cobject)
+        offset = mlobject.bufferOffset = address - base
+        if view is None:
+            mlobject.buffer = ctypes.string_at(address, length)
+        else:
+            mlobject.buffer = view[offset:offset + length]
+    return mlobject
+
+
+def _encodable(subject, buffer_length):
+    """The limits of the format, checked before appending so that a failed append can only mean overflow."""
+    return 0 <= subject <= ML_MAX_SUBJECT and buffer_length <= ML_MAX_BUFFER
+
+
+# Note that the buffer of the cObject is only valid as long as the returned buffer reference exists,
+# so don't lose it! Returns (None, None) if the value does not fit into 32 bits.
+def _cobject(mlobject):
+    value = 0
+    if mlobject.valueIsPresent:
+        value = int32(mlobject.value)
+        if value is None:
+            return None, None
+    cobject = ctypes.create_string_buffer(MLO_OBJECT_SIZE)
+    address = ctypes.addressof(cobject)
+    MLO_setType(address, mlobject.type)
+    MLO_setSubject(address, mlobject.subject)
+    MLO_setValue(address, value)
+    MLO_setValueIsPresent(address, mlobject.valueIsPresent)
+    if mlobject.bufferLength > 0:
+        buffer = mlobject.getBuffer()
+    else:
+        buffer = None
+    MLO_setBuffer(address, buffer, mlobject.bufferLength)
+    return cobject, buffer
+
+
+class MLE(object):
+
+    def __init__(self, size=512):
+        """ml encoder initialization."""
+        self._enc = ctypes.create_string_buffer(MLE_ENCODER_SIZE)
+        self._encp = ctypes.addressof(self._enc)
+        self._cobject = ctypes.create_string_buffer(MLO_OBJECT_SIZE)
+        self._cobjectp = ctypes.addressof(self._cobject)
+        self._buffer = None
+        self.reset(size)
+
+    def reset(self, size=None):
+        """Start a new packet, optionally with a different buffer size. The buffer is reused if large enough."""
+        if size is not None:
+            self.size = size
+            if self._buffer is None or len(self._buffer) < size:
+                self._buffer = ctypes.create_string_buffer(size)
+        MLE_initialize(self._encp, self._buffer, self.size)
+        self.overflow = False
+
+    # libmlformat does not tell why an append failed, objects are checked against the limits of the format
+    # before appending, so a failure is running out of space
+    def _result(self, ndex):
+        if ndex == 0:
+            self.overflow = True
+        return ndex
+
+    def appendObject(self, mlobject):
+        if not _encodable(mlobject.subject, mlobject.bufferLength):
+            return 0
+        cobject, buffer = _cobject(mlobject)
+        if cobject is None:
+            return 0
+        return self._result(MLE_appendObject(self._encp, ctypes.addressof(cobject)))
+
+    def appendOSV(self, object, subject, value):
+        value = int32(value)
+        if value is None or not _encodable(subject, 0):
+            return 0
+        return self._result(MLE_appendOSV(self._encp, object, subject, value))
+
+    def appendOS(self, object, subject):
+        if not _encodable(subject, 0):
+            return 0
+        return self._result(MLE_appendOS(self._encp, object, subject))
+
+    def append_many(self, objects, subjects=None, values=None, buffers=None):
+        """
+        Append (type, subject, value, buffer) tuples or, if subjects is given, objects from the parallel sequences
+        objects (the types), subjects, values and buffers. Value and buffer None mean not present.
+
+        Stops at the first object that can not be appended, returns an array of the indexes of the appended ones.
+        Objects without a buffer take a single MLE_appendOS(V) call, the others reuse one object struct.
+        """
+        if subjects is not None:
+            objects = zip(objects, subjects,
+                          repeat(None) if values is None else values,
+                          repeat(None) if buffers is None else buffers)
+
+        indexes = array("l")
+        enc = self._encp
+        cobject = self._cobjectp
+        for type, subject, value, buffer in objects:
+            if value is not None:
+                value = int32(value)
+                if value is None:
+                    break
+            if not _encodable(subject, len(buffer) if buffer else 0):
+                break
+
+            if buffer:
+                if not isinstance(buffer, bytes):
+                    buffer = bytes(buffer)
+                MLO_setType(cobject, type)
+                MLO_setSubject(cobject, subject)
+                MLO_setValue(cobject, 0 if value is None else value)
+                MLO_setValueIsPresent(cobject, value is not None)
+                MLO_setBuffer(cobject, buffer, len(buffer))
+                ndex = MLE_appendObject(enc, cobject)
+            elif value is None:
+                ndex = MLE_appendOS(enc, type, subject)
+            else:
+                ndex = MLE_appendOSV(enc, type, subject, value)
+
+            if ndex == 0:
+                self.overflow = True
+                break
+            indexes.append(ndex)
+
+        return indexes
+
+    def str(self):
+        """finalize and return buffer"""
+        size = MLE_finalize(self._encp)
+        return self._buffer[0:size]
+
+
+class MLI(object):
+
+    def __init__(self, buffer, copy=True):
+        """
+        ml iterator initilization.
+
+        With copy=False the iterator works directly on any buffer-protocol object (bytes, bytearray, memoryview,
+        mmap) and object buffers are memoryview slices of it. The source is exported until close() is called or
+        the iterator is garbage collected, so a bytearray can not be resized while it is being iterated.
+        """
+        self._iter = ctypes.create_string_buffer(MLI_ITERATOR_SIZE)
+        self._iterp = ctypes.addressof(self._iter)
+        self._cobject = ctypes.create_string_buffer(MLO_OBJECT_SIZE)
+        self._cobjectp = ctypes.addressof(self._cobject)
+        self._copy = copy
+        self._pybuffer = None
+        self.rebind(buffer)
+
+    def rebind(self, buffer):
+        """Restart the iterator on a new buffer, the iterator and object structs are reused."""
+        self.close()
+        if self._copy:
+            self._buffer = bytes(buffer)  # The library only reads the buffer, it can use the bytes directly
+            self._base = ctypes.cast(ctypes.c_char_p(self._buffer), ctypes.c_void_p).value
+            self._length = len(self._buffer)
+            MLI_initialize(self._iterp, self._base, self._length)
+        else:
+            self._pybuffer = _Py_buffer()
+            _PyObject_GetBuffer(buffer, ctypes.byref(self._pybuffer), _PyBUF_SIMPLE)
+            self._buffer = memoryview(buffer).cast("B")
+            self._base = self._pybuffer.buf
+            self._length = self._pybuffer.len
+            MLI_initialize(self._iterp, self._base, self._length)
+
+    def _object(self):
+        if self._pybuffer is None:
+            return _mlobject(self._cobjectp, self._base)
+        return _mlobject(self._cobjectp, self._base, self._buffer)
+
+    def next(self):
+        ndex = MLI_next(self._iterp, self._cobjectp)
+        if ndex > 0:
+            return self._object()
+
+        return None
+
+    def nextWithSubject(self, subject):
+        ndex = MLI_nextWithSubject(self._iterp, subject, self._cobjectp)
+        if ndex > 0:
+            return self._object()
+
+        return None
+
+    def reset(self):
+        return MLI_reset(self._iterp)
+
+    def build_index(self):
+        """Index the packet in one pass, returns a packet.MLIndex. The iterator is reset."""
+        from motexml.packet import MLIndex
+        self.reset()
+        index = MLIndex.from_iterator(self, self._buffer)
+        self.reset()
+        return index
+
+    def close(self):
+        """Release the source buffer of a zero-copy iterator."""
+        if self._pybuffer is not None:
+            _PyBuffer_Release(ctypes.byref(self._pybuffer))
+            self._pybuffer = None
+
+    def __del__(self):
+        self.close()
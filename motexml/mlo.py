@@ -0,0 +1,74 @@
+"""mlo.py: MoteXML object."""
+import ctypes
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+# Values are signed 32 bit integers, unsigned 32 bit values are accepted and wrap around
+ML_VALUE_MIN = -0x80000000
+ML_VALUE_MAX = 0xFFFFFFFF
+
+
+def int32(value):
+    """Return the value as a signed 32 bit integer or None if it does not fit into 32 bits."""
+    if value < ML_VALUE_MIN or value > ML_VALUE_MAX:
+        return None
+    if value > 0x7FFFFFFF:
+        return value - 0x100000000
+    return value
+
+
+class MLObject(object):
+
+    # Decoders create an object per element, slots keep them small
+    __slots__ = ("index", "type", "value", "valueIsPresent", "subject", "buffer", "bufferLength", "bufferOffset")
+
+    def __init__(self, cobject=None):
+        self.index = 0
+        self.type = 0
+        self.value = None
+        self.valueIsPresent = False
+        self.subject = 0
+        self.buffer = None
+        self.bufferLength = 0
+        self.bufferOffset = -1  # Offset of the buffer in the decoded packet, -1 if not known
+        if cobject is not None:
+            # A libmlformat object, as the iterator of the libmlformat-only mle module gave them
+            from motexml import mlctypes
+            decoded = mlctypes._mlobject(ctypes.addressof(cobject), 0)
+            for attribute in self.__slots__:
+                setattr(self, attribute, getattr(decoded, attribute))
+            self.bufferOffset = -1
+
+    def setValue(self, value):
+        if value is None:
+            self.valueIsPresent = False
+        else:
+            self.valueIsPresent = True
+        self.value = value
+
+    def getBuffer(self):
+        if self.buffer is None:
+            return b""
+        return bytes(self.buffer[0:self.bufferLength])
+
+    # the buffer is expected to be a raw string
+    def setBuffer(self, bufstring, length):
+        self.bufferLength = length
+        self.buffer = bytes(bufstring[0:length])
+        self.bufferOffset = -1
+
+    def clearBuffer(self):
+        self.buffer = None
+        self.bufferLength = 0
+        self.bufferOffset = -1
+
+    # Note that the buffer of the cObject is only valid as long as the cObject exists,
+    # so don't lose that reference! Returns None if the value does not fit into 32 bits.
+    def cObject(self):
+        """The object as a libmlformat object, needs the ctypes backend."""
+        from motexml import mlctypes
+        cobject, buffer = mlctypes._cobject(self)
+        if cobject is not None:
+            cobject.buffer = buffer
+        return cobject
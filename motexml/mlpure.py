@@ -0,0 +1,307 @@
+"""mlpure.py: MoteXML encoder and iterator, pure-Python backend.
+
+Every object is encoded as a header byte followed by the fields announced in the header:
+
+    header | subject | type | value | buffer length | buffer
+
+    0x80     buffer present, preceded by a 1 byte length
+    0x40     subject present, 1 byte (0x60 - 2 bytes)
+    0x18     type length - 0x08: 1 byte, 0x10: 2 bytes, 0x18: 4 bytes
+    0x07     value length - 0: not present, 1: 1 byte, 2: 2 bytes, 3: 4 bytes
+
+Multi-byte fields are little-endian, the type is unsigned and the value a signed 32 bit integer,
+encoding values that do not fit into 32 bits fails.
+Objects are numbered from 1 in the order they appear in the packet.
+"""
+from array import array
+from itertools import repeat
+import struct
+
+from motexml.mlo import MLObject, int32
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+name = "python"
+
+ML_BUFFER = 0x80
+ML_SUBJECT = 0x40
+ML_SUBJECT_WIDE = 0x20
+ML_TYPE_MASK = 0x18
+ML_VALUE_MASK = 0x07
+
+ML_MAX_SUBJECT = 0xFFFF
+ML_MAX_BUFFER = 0xFF
+
+
+def _header_layout(header):
+    """Return (struct, has_subject, has_value, has_buffer) for a header byte or None if it is invalid."""
+    fmt = "<"
+    if header & ML_SUBJECT:
+        fmt += "H" if header & ML_SUBJECT_WIDE else "B"
+    elif header & ML_SUBJECT_WIDE:
+        return None
+
+    tlen = header & ML_TYPE_MASK
+    if tlen == 0:
+        return None
+    fmt += {0x08: "B", 0x10: "H", 0x18: "I"}[tlen]
+
+    vlen = header & ML_VALUE_MASK
+    if vlen > 3:
+        return None
+    if vlen:
+        fmt += "bhi"[vlen - 1]
+
+    if header & ML_BUFFER:
+        fmt += "B"
+
+    return struct.Struct(fmt), bool(header & ML_SUBJECT), vlen != 0, bool(header & ML_BUFFER)
+
+
+_LAYOUTS = tuple(_header_layout(h) for h in range(256))
+
+
+def encode_object(type, subject, value=None, buffer=None):
+    """
+    Encode a single object, returns the encoded bytes or None if the object can not be represented.
+    """
+    header = 0
+    fmt = "<B"
+    args = [0]
+
+    if subject:
+        if subject < 0 or subject > ML_MAX_SUBJECT:
+            return None
+        if subject > 0xFF:
+            header |= ML_SUBJECT | ML_SUBJECT_WIDE
+            fmt += "H"
+        else:
+            header |= ML_SUBJECT
+            fmt += "B"
+        args.append(subject)
+
+    type &= 0xFFFFFFFF
+    if type <= 0xFF:
+        header |= 0x08
+        fmt += "B"
+    elif type <= 0xFFFF:
+        header |= 0x10
+        fmt += "H"
+    else:
+        header |= 0x18
+        fmt += "I"
+    args.append(type)
+
+    if value is not None:
+        value = int32(value)
+        if value is None:
+            return None
+        if -0x80 <= value <= 0x7F:
+            header |= 1
+            fmt += "b"
+        elif -0x8000 <= value <= 0x7FFF:
+            header |= 2
+            fmt += "h"
+        else:
+            header |= 3
+            fmt += "i"
+        args.append(value)
+
+    if buffer:
+        if len(buffer) > ML_MAX_BUFFER:
+            return None
+        header |= ML_BUFFER
+        fmt += "B"
+        args.append(len(buffer))
+
+    args[0] = header
+    data = struct.pack(fmt, *args)
+    if buffer:
+        return data + bytes(buffer)
+    return data
+
+
+def decode_object(data, offset):
+    """
+    Decode the object at offset.
+
+    Returns (type, subject, value, valueIsPresent, bufferOffset, bufferLength, nextOffset) or None if
+    the data at offset is not a valid object.
+    """
+    if offset >= len(data):
+        return None
+    layout = _LAYOUTS[data[offset]]
+    if layout is None:
+        return None
+    st, has_subject, has_value, has_buffer = layout
+
+    start = offset + 1
+    end = start + st.size
+    if end > len(data):
+        return None
+    fields = st.unpack_from(data, start)
+
+    i = 0
+    subject = 0
+    if has_subject:
+        subject = fields[0]
+        i = 1
+    type = fields[i]
+    value = None
+    if has_value:
+        value = fields[i + 1]
+    buflen = 0
+    if has_buffer:
+        buflen = fields[-1]
+        if end + buflen > len(data):
+            return None
+
+    return type, subject, value, has_value, end, buflen, end + buflen
+
+
+class MLE(object):
+
+    def __init__(self, size=512):
+        """ml encoder initialization."""
+        self._buffer = bytearray()
+        self.reset(size)
+
+    def reset(self, size=None):
+        """Start a new packet, optionally with a different buffer size."""
+        if size is not None:
+            self.size = size
+        del self._buffer[:]
+        self._count = 0
+        self.overflow = False
+
+    def _append(self, type, subject, value, buffer):
+        data = encode_object(type, subject, value, buffer)
+        if data is None:
+            return 0
+        if len(self._buffer) + len(data) > self.size:
+            self.overflow = True
+            return 0
+        self._buffer += data
+        self._count += 1
+        return self._count
+
+    def appendObject(self, mlobject):
+        if mlobject.valueIsPresent:
+            value = mlobject.value
+        else:
+            value = None
+        if mlobject.bufferLength > 0:
+            buffer = mlobject.getBuffer()
+        else:
+            buffer = None
+        return self._append(mlobject.type, mlobject.subject, value, buffer)
+
+    def appendOSV(self, object, subject, value):
+        return self._append(object, subject, value, None)
+
+    def appendOS(self, object, subject):
+        return self._append(object, subject, None, None)
+
+    def append_many(self, objects, subjects=None, values=None, buffers=None):
+        """
+        Append (type, subject, value, buffer) tuples or, if subjects is given, objects from the parallel sequences
+        objects (the types), subjects, values and buffers. Value and buffer None mean not present.
+
+        Stops at the first object that can not be appended, returns an array of the indexes of the appended ones.
+        """
+        if subjects is not None:
+            objects = zip(objects, subjects,
+                          repeat(None) if values is None else values,
+                          repeat(None) if buffers is None else buffers)
+
+        indexes = array("l")
+        data = self._buffer
+        size = self.size
+        count = self._count
+        for type, subject, value, buffer in objects:
+            chunk = encode_object(type, subject, value, buffer)
+            if chunk is None:
+                break
+            if len(data) + len(chunk) > size:
+                self.overflow = True
+                break
+            data += chunk
+            count += 1
+            indexes.append(count)
+
+        self._count = count
+        return indexes
+
+    def str(self):
+        """finalize and return buffer"""
+        return bytes(self._buffer)
+
+
+class MLI(object):
+
+    def __init__(self, buffer, copy=True):
+        """
+        ml iterator initilization.
+
+        With copy=False the iterator works directly on any buffer-protocol object (bytes, bytearray, memoryview,
+        mmap) and object buffers are memoryview slices of it.
+        """
+        self._copy = copy
+        self.rebind(buffer)
+
+    def rebind(self, buffer):
+        """Restart the iterator on a new buffer."""
+        if self._copy:
+            self._buffer = bytes(buffer)
+        else:
+            self._buffer = memoryview(buffer).cast("B")
+        self._length = len(self._buffer)
+        self._offset = 0
+        self._index = 0
+
+    def _next(self):
+        decoded = decode_object(self._buffer, self._offset)
+        if decoded is None:
+            return None
+        type, subject, value, present, bufoffset, buflen, self._offset = decoded
+        self._index += 1
+
+        mlobject = MLObject()
+        mlobject.index = self._index
+        mlobject.type = type
+        mlobject.subject = subject
+        mlobject.value = value
+        mlobject.valueIsPresent = present
+        if buflen > 0:
+            mlobject.buffer = self._buffer[bufoffset:bufoffset + buflen]
+            mlobject.bufferLength = buflen
+            mlobject.bufferOffset = bufoffset
+        return mlobject
+
+    def next(self):
+        return self._next()
+
+    def nextWithSubject(self, subject):
+        mlobject = self._next()
+        while mlobject is not None and mlobject.subject != subject:
+            mlobject = self._next()
+        return mlobject
+
+    def reset(self):
+        self._offset = 0
+        self._index = 0
+
+    def build_index(self):
+        """Index the packet in one pass, returns a packet.MLIndex. The iterator is reset."""
+        from motexml.packet import MLIndex
+        self.reset()
+        index = MLIndex.from_iterator(self, self._buffer)
+        self.reset()
+        return index
+
+    def close(self):
+        """Release the source buffer of a zero-copy iterator."""
+        self._buffer = b""
+        self._length = 0
+        self._offset = 0
@@ -2,11 +2,17 @@
 from __future__ import absolute_import
 
 from codecs import decode, encode
-import re
+import json
+import sys
+import time
 from xml.etree import ElementTree
 from xml.dom import minidom
 
 from motexml import mle
+from motexml import mlpure
+from motexml.tagdb import TagDatabase, TagFileWatcher
+from motexml.cache import freeze_tree, frozen_size, thaw_tree
+from motexml.packet import DecodedPacket
 
 import logging
 log = logging.getLogger(__name__)
@@ -31,6 +37,22 @@ def xml_from_file(filename):
         return None
 
 
+def xml_packets_from_file(source, tag="xml_packet"):
+    """
+    Yield the packet elements of a file (name or file object) holding a packet or a root element with packets.
+    Yielded packets are dropped from the document, memory use depends on the size of a packet, not the file.
+    """
+    root = None
+    for event, element in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+        elif element.tag == tag:
+            yield element
+            if element is not root:
+                root.clear()
+
+
 def xml_from_string(xmlstring):
     try:
         element = ElementTree.fromstring(xmlstring)
@@ -41,16 +63,96 @@ def xml_from_string(xmlstring):
     return element
 
 
-def xml_to_string(element):
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+
+def _xml_is_plain(element):
+    """
+    Check that the tree only has elements with attributes, no text, comments or multi-line attributes,
+    as produced by MoteXMLTranslator.translate_to_xml. Namespaced names need prefixes, they are not plain either.
+    """
+    for e in element.iter():
+        if e.text or e.tail or not isinstance(e.tag, str) or e.tag.startswith("{"):
+            return False
+        for k, v in e.attrib.items():
+            if "\n" in v or "\r" in v or k.startswith("{"):
+                return False
+    return True
+
+
+def _escape_attribute(value):
+    # Same escaping as minidom
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+# ElementTree and minidom sort attributes before Python 3.8, the output stays as it was there
+SORTED_ATTRIBUTES = sys.version_info < (3, 8)
+
+
+def _xml_parts(element, parts, indent, prefix):
+    parts.append(prefix)
+    parts.append("<")
+    parts.append(element.tag)
+    items = element.items()
+    if SORTED_ATTRIBUTES:
+        items = sorted(items)
+    for k, v in items:
+        parts.append(' %s="%s"' % (k, _escape_attribute(v)))
+
+    if len(element):
+        parts.append(">")
+        child_prefix = prefix + indent
+        for c in element:
+            _xml_parts(c, parts, indent, child_prefix)
+        parts.append(prefix)
+        parts.append("</%s>" % element.tag)
+    else:
+        parts.append("/>")
+
+
+def _xml_to_string_minidom(element, indent):
+    simple = ElementTree.tostring(element, 'utf-8')
+    parsed = minidom.parseString(simple)
+    if indent is None:
+        return parsed.toxml()
+    pretty = parsed.toprettyxml(indent=indent)
+    return "\n".join([ll.rstrip() for ll in pretty.splitlines() if ll.strip()])
+
+
+def xml_to_string(element, indent="    "):
+    """
+    Serialize the tree with an XML declaration, each element on its own line indented by indent.
+    With indent None the output is compact, a single line without any whitespace between elements.
+    """
     if element is not None:
-        simple = ElementTree.tostring(element, 'utf-8')
-        parsed = minidom.parseString(simple)
-        pretty = parsed.toprettyxml(indent="    ")
-        return "\n".join([ll.rstrip() for ll in pretty.splitlines() if ll.strip()])
+        if not _xml_is_plain(element):
+            return _xml_to_string_minidom(element, indent)
+
+        parts = [XML_DECLARATION]
+        if indent is None:
+            _xml_parts(element, parts, "", "")
+        else:
+            _xml_parts(element, parts, indent, "\n")
+        return "".join(parts)
 
     return "<dt_none/>"
 
 
+def write_xml(element, f, indent="    "):
+    """
+    Write the tree to the file object f, see xml_to_string.
+    """
+    if element is not None and _xml_is_plain(element):
+        parts = [XML_DECLARATION]
+        if indent is None:
+            _xml_parts(element, parts, "", "")
+        else:
+            _xml_parts(element, parts, indent, "\n")
+        f.writelines(parts)
+    else:
+        f.write(xml_to_string(element, indent))
+
+
 def unsigned32(value):
     return 0xFFFFFFFF & value
 
@@ -63,19 +165,23 @@ def get_child_ovalue(element, child):
     return None
 
 
+def parse_ovalue(v):
+    v = v.lstrip().rstrip()
+    if v.startswith("0x") or v.startswith("0X"):
+        return int(v, 16)
+    if v.startswith("0b") or v.startswith("0B"):
+        return int(v, 2)
+    elif "." in v:
+        return int(float(v))
+    else:
+        return int(v)
+
+
 def get_ovalue(element, key="value"):
     if element is not None:
         v = element.get(key)
         if v is not None:
-            v = v.lstrip().rstrip()
-            if v.startswith("0x") or v.startswith("0X"):
-                return int(v, 16)
-            if v.startswith("0b") or v.startswith("0B"):
-                return int(v, 2)
-            elif "." in v:
-                return int(float(v))
-            else:
-                return int(v)
+            return parse_ovalue(v)
 
     return None
 
@@ -100,43 +206,170 @@ def get_buffer_as_uint8_list(element):
     return None
 
 
+# Encoded size of an object without its buffer: header, subject, type, value and buffer length at their widest
+ML_OBJECT_OVERHEAD = 12
+MIN_ENCODE_SIZE = 512  # Pooled encoders are never smaller than the default MLE size
+
+
+class EncodingPlan(object):
+    """
+    A packet template compiled with MoteXMLTranslator.compile_template. The objects are encoded once, encode()
+    only re-encodes the objects whose fields are given and joins the bytes.
+    """
+
+    def __init__(self, translator, objects, fields):
+        self._translator = translator
+        self._objects = objects
+        self._fields = fields
+        self._chunks = [mlpure.encode_object(*o) for o in objects]
+        self.direct = None not in self._chunks
+        # Header bytes, each standing for one combination of field widths, known to encode like the backend
+        self._headers = set(chunk[0] for chunk in self._chunks if chunk)
+
+    @property
+    def fields(self):
+        return tuple(self._fields)
+
+    def _encode_direct(self, objects, changed):
+        if changed:
+            chunks = list(self._chunks)
+            for pos in changed:
+                chunk = mlpure.encode_object(*objects[pos])
+                if chunk is None:
+                    log.error("failed to encode object %u", pos + 1)
+                    return None
+                if chunk[0] not in self._headers:
+                    if self._translator._encode_objects([objects[pos]]) != chunk:
+                        log.warning("object %u does not encode like the backend, encoding with the backend", pos + 1)
+                        self.direct = False
+                        return self._translator._encode_objects(objects)
+                    self._headers.add(chunk[0])
+                chunks[pos] = chunk
+        else:
+            chunks = self._chunks
+
+        data = b"".join(chunks)
+        if len(data) > self._translator.max_encode_size:
+            log.error("packet does not fit into %u bytes", self._translator.max_encode_size)
+            return None
+        return data
+
+    def encode(self, **values):
+        """
+        Encode the template with the named fields replaced. Values can be numbers or strings as in the value
+        attribute, buffers bytes or hex strings. Raises KeyError for unknown fields and ValueError for bad values.
+        """
+        objects = self._objects
+        changed = []
+        if values:
+            codes = self._translator.tagdb.codes
+            objects = list(objects)
+            for name, v in values.items():
+                pos, attribute = self._fields[name]
+                type, subject, value, buffer = objects[pos]
+                if attribute == "value":
+                    value = self._translator._parse_value(v, codes)
+                elif isinstance(v, str):
+                    buffer = decode(v, "hex")
+                else:
+                    buffer = bytes(v)
+                objects[pos] = (type, subject, value, buffer)
+                changed.append(pos)
+
+        if self.direct:
+            return self._encode_direct(objects, changed)
+        return self._translator._encode_objects(objects)
+
+
+class PacketQuery(object):
+    """
+    Tag name paths resolved to type codes by MoteXMLTranslator.compile_query.
+    """
+
+    def __init__(self, paths, types):
+        self.paths = paths
+        self.types = types  # A tuple of type codes per path, None for a "*" wildcard
+
+
 class MoteXMLTranslator(object):
 
-    def __init__(self, filename=None):
-        self._tagdbint = {}
-        self._tagdbintrepr = {}
-        self._tagdbstr = {}
-        self._tagdbint[0] = "dt_none"
-        self._tagdbstr["dt_none"] = 0
+    # Encoding gives up when a packet does not fit into this many bytes
+    max_encode_size = 1024*1024
+
+    # Seconds between repeated warnings about the same unknown type
+    unknown_warning_interval = 60.0
+
+    def __init__(self, filename=None, backend=None, tagdb=None, stats=None, cache=None):
+        """
+        The backend names the MoteXML codec to use, by default the one selected in the mle module.
+        tagdb is a TagDatabase to start from, translators can share one instead of each loading the tag file.
+        stats is a stats.Stats that the translation stages are recorded in, nothing is measured without it.
+        cache is a cache.LRUCache for the results of translate_to_xml, translate_to_string and translate_from_xml,
+        repeated packets are then translated only once for as long as the tag database does not change. Results are
+        charged to the cache's size by what they hold: packets and strings by length, trees by an estimate in bytes.
+        """
+        if backend is None:
+            self._mle = mle
+        else:
+            self._mle = mle.load_backend(backend)
+        self._encoders = []  # Pool of encoders for translate_from_xml
+        self._queries = {}  # Compiled queries by paths
+        self._unknown = {}  # Unknown type: [time of last warning, objects since]
+        self._watcher = None
+        self._basedb = tagdb if tagdb is not None else TagDatabase()
+        self._tagfiles = []
+        self.tagdb = self._basedb
+        self.stats = stats
+        self.cache = cache
         if filename is not None:
             self.load_tag_db(filename)
 
     def load_tag_db(self, filename):
-        with open(filename, 'r') as f:
-            for lnum, line in enumerate(f):
-                line = line.split("#")[0].rstrip().lstrip()
-                if line:
-                    tokens = re.findall(r'[\w|%]+', line)
-                    if len(tokens) >= 2:
-                        code = int(tokens[0], 16)
-                        text = tokens[1]
-                        self._tagdbint[code] = text
-                        self._tagdbstr[text] = code
-                        if len(tokens) >= 3:
-                            if tokens[2] == "dt_types":
-                                self._tagdbintrepr[code] = tokens[2]
-                            else:
-                                try:
-                                    tokens[2] % (0)
-                                    self._tagdbintrepr[code] = tokens[2]
-                                except TypeError:
-                                    log.error("%s line %i: Cannot use \"%s\" as formatting string",
-                                              filename, lnum, tokens[2])
-                                    self._tagdbintrepr[code] = "%i"
-                        else:
-                            self._tagdbintrepr[code] = "%i"
+        """Add the types in the file to the tag database, the shared database itself is not modified."""
+        self._set_tagdb(TagDatabase.from_files([filename], self.tagdb))
+        self._tagfiles.append(filename)
+
+    def _set_tagdb(self, tagdb):
+        # Replacing the references is atomic, a decode in progress keeps using the database it started with
+        self._queries = {}
+        self._unknown = {}
+        self.tagdb = tagdb
+        if self.cache is not None:
+            self.cache.clear()
+
+    def watch(self, interval=5.0):
+        """
+        Reload the tag files given to the translator in a background thread when they change, checking every
+        interval seconds. Decoding never waits for a reload and does not look at the files itself.
+        """
+        self.unwatch()
+        self._watcher = TagFileWatcher(self._tagfiles, self._set_tagdb, interval, self._basedb).start()
+        return self._watcher
+
+    def unwatch(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _warn_unknown(self, type):
+        if self.stats is not None:
+            self.stats.count("unknown_types")
+        now = time.monotonic()
+        seen = self._unknown.get(type)
+        if seen is None:
+            self._unknown[type] = [now, 0]
+            log.warning("type %x is unknown", type)
+        elif now - seen[0] >= self.unknown_warning_interval:
+            log.warning("type %x is unknown (%u more objects since the last warning)", type, seen[1])
+            seen[0] = now
+            seen[1] = 0
+        else:
+            seen[1] += 1
+
+    # The tag database is read once per translation and passed down as codes (names to type codes) or
+    # formatters, so a reload never mixes two databases in one packet
 
-    def _get_string_value(self, element):
+    def _get_string_value(self, element, codes):
         """
         Assume that the element value is another tag type and try to look it up.
         """
@@ -144,96 +377,534 @@ class MoteXMLTranslator(object):
             v = element.get("value")
             if v is not None:
                 v = v.lstrip().rstrip()
-                if v in self._tagdbstr:
-                    return self._tagdbstr[v]
+                if v in codes:
+                    return codes[v]
                 raise ValueError("%s" % v)
         return None
 
-    def _append_with_children(self, enc, subject, element):
-        if element.tag in self._tagdbstr:
-            mlobject = mle.MLObject()
-            mlobject.type = self._tagdbstr[element.tag]
-            mlobject.subject = subject
+    def _element_value(self, element, codes):
+        try:
+            return get_ovalue(element)
+        except ValueError:  # Has value, but not a number, maybe it is a string that can be turned into a number
+            return self._get_string_value(element, codes)
+
+    def _parse_value(self, v, codes):
+        if v is None or isinstance(v, int):
+            return v
+        try:
+            return parse_ovalue(v)
+        except ValueError:
+            v = v.lstrip().rstrip()
+            if v in codes:
+                return codes[v]
+            raise ValueError("%s" % v)
 
+    def _encode_with_retry(self, encode, size, enc=None):
+        """
+        Call encode with enc or a pooled encoder of at least size bytes, the encoder is returned to the pool. If the
+        encoder runs out of space, the buffer is grown and encoding retried, up to max_encode_size.
+        """
+        size = max(size, MIN_ENCODE_SIZE)
+        if enc is None:
             try:
-                value = get_ovalue(element)
-                if value is not None:
-                    mlobject.setValue(value)
-            except ValueError:  # Has value, but not a number, maybe it is a string that can be turned into a number
-                try:
-                    value = self._get_string_value(element)
-                    if value is not None:
-                        mlobject.setValue(value)
-                except ValueError:
-                    log.exception("")
-                    return 1
-
-            if element.get("buffer") is not None:
-                buf = decode(element.get("buffer"), "hex")
-                mlobject.setBuffer(buf, len(buf))
-
-            ndex = enc.appendObject(mlobject)
-
-            for c in list(element):
-                if self._append_with_children(enc, ndex, c) != 0:
-                    return 1
-        else:
-            log.error("tag %s is unknown", element.tag)
-            return 1
-        return 0
+                enc = self._encoders.pop()
+            except IndexError:
+                enc = self._mle.MLE(size)
+        enc.reset(max(size, enc.size))
+
+        try:
+            while True:
+                data = encode(enc)
+                if data is not None or not enc.overflow:
+                    return data
+                if enc.size >= self.max_encode_size:
+                    log.error("packet does not fit into %u bytes", enc.size)
+                    return None
+                log.debug("packet does not fit into %u bytes, retrying", enc.size)
+                enc.reset(min(enc.size * 2, self.max_encode_size))
+        finally:
+            self._encoders.append(enc)
 
     def translate_from_xml(self, xml_packet):
-        enc = mle.MLE()
-        for c in list(xml_packet):
-            if self._append_with_children(enc, 0, c) != 0:
-                return None
+        """
+        Encode the packet with a pooled encoder that is sized from an estimate of the packet.
+        """
+        db = self.tagdb
+        if self.cache is None:
+            return self._translate_from_xml(xml_packet, db.codes)
+        key = ("encode", db, freeze_tree(xml_packet))
+        data = self.cache.get(key)
+        if data is None:
+            data = self._translate_from_xml(xml_packet, db.codes)
+            if data is not None:
+                self.cache.put(key, data, len(data))
+        return data
+
+    def _translate_from_xml(self, xml_packet, codes):
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        objects = []
+        try:
+            for c in list(xml_packet):
+                self._xml_objects(c, 0, objects, codes)
+        except ValueError as e:
+            log.error("%s", e)
+            if stats is not None:
+                stats.count("encode_failures")
+            return None
+        if stats is None:
+            return self._encode_objects(objects)
+
+        collected = time.perf_counter()
+        stats.record("collect", collected - start, len(objects))
+        data = self._encode_objects(objects)
+        stats.record("encode", time.perf_counter() - collected, len(objects), len(data) if data is not None else 0)
+        if data is None:
+            stats.count("encode_failures")
+        return data
+
+    def _append_object(self, enc, type, subject, value, buffer):
+        mlobject = mle.MLObject()
+        mlobject.type = type
+        mlobject.subject = subject
+        mlobject.setValue(value)
+        if buffer:
+            mlobject.setBuffer(buffer, len(buffer))
+        ndex = enc.appendObject(mlobject)
+        if ndex == 0 and not enc.overflow:
+            log.error("failed to encode type %x", type)
+        return ndex
+
+    def _append_objects(self, enc, objects):
+        indexes = enc.append_many(objects)
+        if len(indexes) < len(objects):
+            if not enc.overflow:
+                log.error("failed to encode type %x", objects[len(indexes)][0])
+            return None
         return enc.str()
 
-    def _xml_append_with_children(self, element, subject, mote_packet):
-        iterator = mle.MLI(mote_packet)
-        obj = iterator.nextWithSubject(subject)
+    def _encode_objects(self, objects, enc=None):
+        """Encode a list of (type, subject, value, buffer) tuples, with enc if given, see _encode_with_retry."""
+        size = sum(ML_OBJECT_OVERHEAD + (len(o[3]) if o[3] else 0) for o in objects)
+        return self._encode_with_retry(lambda enc: self._append_objects(enc, objects), size, enc)
+
+    def _element_object(self, element, subject, codes):
+        """
+        Return the (type, subject, value, buffer) tuple of the element, raises ValueError if it can't be encoded.
+        """
+        type = codes.get(element.tag)
+        if type is None:
+            raise ValueError("tag %s is unknown" % element.tag)
+
+        buffer = element.get("buffer")
+        if buffer is not None:
+            buffer = decode(buffer, "hex")
+        return type, subject, self._element_value(element, codes), buffer
+
+    def iter_translate_from_xml(self, source, tag="xml_packet"):
+        """
+        Encode the packet elements of a document (file name or file object) while it is being parsed, objects
+        are appended to the encoder as their start tags arrive. The document can be a single packet or have
+        packets as the children of its root element, handled elements are dropped, so memory use depends on
+        the size of a packet and not the document.
+
+        Yields the encoded packet or None for every packet element.
+        """
+        root = None
+        stack = None  # Object indexes of the open elements of the current packet, None outside of packets
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                if stack is None:
+                    if element.tag == tag:
+                        stack = [0]
+                        objects = []
+                        codes = self.tagdb.codes
+                        failed = False
+                        if self.stats is not None:
+                            start = time.perf_counter()
+                        try:
+                            enc = self._encoders.pop()
+                            enc.reset(max(enc.size, MIN_ENCODE_SIZE))
+                        except IndexError:
+                            enc = self._mle.MLE(MIN_ENCODE_SIZE)
+                elif failed:
+                    stack.append(0)
+                else:
+                    try:
+                        obj = self._element_object(element, stack[-1], codes)
+                    except ValueError as e:
+                        log.error("%s", e)
+                        failed = True
+                        stack.append(0)
+                        continue
+                    objects.append(obj)
+                    stack.append(len(objects))
+                    # After an overflow the objects are only collected and encoded again at the end
+                    if not enc.overflow and self._append_object(enc, *obj) == 0 and not enc.overflow:
+                        failed = True
+            elif stack is not None:
+                if len(stack) > 1:
+                    stack.pop()
+                    element.clear()
+                else:
+                    stack = None
+                    if failed:
+                        data = None
+                        self._encoders.append(enc)
+                    elif enc.overflow:
+                        # Grows the encoder, so the next packets of the same size can be streamed
+                        data = self._encode_objects(objects, enc)
+                    else:
+                        data = enc.str()
+                        self._encoders.append(enc)
+                    if element is not root:
+                        root.clear()
+                    if self.stats is not None:
+                        self.stats.record("stream", time.perf_counter() - start, len(objects),
+                                          len(data) if data is not None else 0)
+                        if data is None:
+                            self.stats.count("encode_failures")
+                    yield data
+
+    def _xml_objects(self, element, subject, objects, codes, positions=None):
+        """
+        Append the (type, subject, value, buffer) tuples of the element and its children to objects, positions
+        maps the elements to their positions in objects if given.
+        """
+        objects.append(self._element_object(element, subject, codes))
+        if positions is not None:
+            positions[element] = len(objects) - 1
+
+        ndex = len(objects)
+        for c in list(element):
+            self._xml_objects(c, ndex, objects, codes, positions)
+
+    def compile_template(self, xml_packet, fields=None):
+        """
+        Compile a packet into an EncodingPlan for encoding it repeatedly with different values.
+
+        fields maps field names to ElementPath expressions relative to xml_packet, selecting the element whose
+        value attribute (or buffer attribute, if the path ends with "@buffer") the field substitutes, for example
+        {"seq": "dt_subscription/dt_seq", "resource": "dt_subscription/dt_resource@buffer"}. Raises ValueError if
+        a path does not select an element. Returns None if the packet can not be encoded.
+        """
+        objects = []
+        positions = {}
+        codes = self.tagdb.codes
+        try:
+            for c in list(xml_packet):
+                self._xml_objects(c, 0, objects, codes, positions)
+        except ValueError as e:
+            log.error("%s", e)
+            return None
+
+        slots = {}
+        for name, path in (fields or {}).items():
+            attribute = "value"
+            for suffix in ("@value", "@buffer"):
+                if path.endswith(suffix):
+                    path = path[:-len(suffix)]
+                    attribute = suffix[1:]
+            element = xml_packet.find(path)
+            if element not in positions:
+                raise ValueError("%s does not select an element" % path)
+            slots[name] = (positions[element], attribute)
+
+        plan = EncodingPlan(self, objects, slots)
+        expected = self.translate_from_xml(xml_packet)
+        if expected is None:
+            return None
+        # Emit bytes directly only if that matches the output of the backend encoder
+        plan.direct = plan.direct and plan.encode() == expected
+        return plan
+
+    def _xml_index_children(self, iterator):
+        """
+        Walk the packet once and group the objects by their subject, preserving packet order.
+        """
+        children = {}
+        obj = iterator.next()
         while obj is not None:
-            if obj.type in self._tagdbint:
-                type = self._tagdbint[obj.type]
-                repr = self._tagdbintrepr[obj.type]
+            if obj.subject in children:
+                children[obj.subject].append(obj)
             else:
-                type = "dt_unknown_%08x" % (obj.type & 0xffffffff)
-                repr = "%i"
-                log.warning("type %x is unknown", obj.type & 0xffffffff)
+                children[obj.subject] = [obj]
+            obj = iterator.next()
+        return children
 
+    def _xml_format_object(self, obj, formatters):
+        """
+        Return the tag name and the value and buffer attribute strings of an object,
+        value and buffer are None if not present. formatters is TagDatabase.formatters.
+        """
+        formatter = formatters.get(obj.type)
+        if formatter is None:
+            formatter = ("dt_unknown_%08x" % (obj.type & 0xffffffff), str)
+            self._warn_unknown(obj.type & 0xffffffff)
+        type, format = formatter
+
+        value = None
+        if obj.valueIsPresent:
+            value = format(obj.value)
+
+        buffer = None
+        if obj.bufferLength > 0:
+            # The decode will use the default 'ascii' encoding - this is guaranteed due to
+            # the hex str/bytes only containing elements from the class [0-9A-F]
+            buffer = decode(encode(obj.getBuffer(), "hex"))
+
+        return type, value, buffer
+
+    def _xml_append_with_children(self, element, subject, children, formatters):
+        # Each subject is expanded only once, a malformed packet can not make the recursion loop
+        for obj in children.pop(subject, ()):
+            type, value, buffer = self._xml_format_object(obj, formatters)
             subelement = ElementTree.SubElement(element, type)
-            if obj.valueIsPresent:
-                if repr == "dt_types":
-                    if obj.value in self._tagdbint:
-                        value = self._tagdbint[obj.value]
-                    else:
-                        value = "0x%X" % (obj.value)
-                else:
-                    value = repr % (obj.value)
+            if value is not None:
                 subelement.set("value", value)
-            if obj.bufferLength > 0:
-                # The decode will use the default 'ascii' encoding - this is guaranteed due to
-                # the hex str/bytes only containing elements from the class [0-9A-F]
-                subelement.set("buffer", decode(encode(obj.getBuffer(), "hex")))
+            if buffer is not None:
+                subelement.set("buffer", buffer)
 
-            if self._xml_append_with_children(subelement, obj.index, mote_packet) > 0:
+            if self._xml_append_with_children(subelement, obj.index, children, formatters) > 0:
                 return 1
 
-            obj = iterator.nextWithSubject(subject)
-
         return 0
 
-    def translate_to_xml(self, mote_packet):
+    def _xml_tree(self, iterator, formatters):
         element = ElementTree.Element("xml_packet")
-        if self._xml_append_with_children(element, 0, mote_packet) == 0:
+        children = self._xml_index_children(iterator)
+        if self._xml_append_with_children(element, 0, children, formatters) == 0:
             return element
 
         return None
 
+    def _xml_records(self, iterator, formatters):
+        records = []
+        obj = iterator.next()
+        while obj is not None:
+            type, value, buffer = self._xml_format_object(obj, formatters)
+            records.append((obj.index, obj.subject, type, value, buffer))
+            obj = iterator.next()
+        return records
+
+    def translate_to_xml(self, mote_packet):
+        db = self.tagdb
+        if self.cache is None:
+            return self._translate_to_xml(mote_packet, db)
+        # The cache holds an immutable form of the tree, every call returns a new tree
+        mote_packet = bytes(mote_packet)
+        key = ("xml", db, mote_packet)
+        frozen = self.cache.get(key)
+        if frozen is None:
+            element = self._translate_to_xml(mote_packet, db)
+            if element is None:
+                return None
+            frozen = freeze_tree(element)
+            self.cache.put(key, frozen, frozen_size(frozen))
+            return element
+        return thaw_tree(frozen)
+
+    def translate_to_string(self, mote_packet, indent="    "):
+        """
+        Translate the packet into an XML document string like xml_to_string(translate_to_xml(mote_packet), indent),
+        returns None if the packet can not be translated.
+        """
+        db = self.tagdb
+        if self.cache is not None:
+            mote_packet = bytes(mote_packet)
+            key = ("string", db, mote_packet, indent)
+            string = self.cache.get(key)
+            if string is not None:
+                return string
+
+        element = self._translate_to_xml(mote_packet, db)
+        if element is None:
+            return None
+        string = xml_to_string(element, indent)
+        if self.cache is not None:
+            self.cache.put(key, string, len(string))
+        return string
+
+    def _translate_to_xml(self, mote_packet, db):
+        formatters = db.lookup_formatters
+        if self.stats is not None:
+            return self._translate_measured(mote_packet, self._xml_append_with_children,
+                                            ElementTree.Element("xml_packet"), formatters)
+        iterator = self._mle.MLI(mote_packet, copy=False)
+        element = self._xml_tree(iterator, formatters)
+        iterator.close()
+        return element
+
+    def _translate_measured(self, mote_packet, append, root, formatters):
+        """translate_to_xml and translate_to_dict with the iterate and tree stages recorded."""
+        start = time.perf_counter()
+        iterator = self._mle.MLI(mote_packet, copy=False)
+        children = self._xml_index_children(iterator)
+        iterated = time.perf_counter()
+        objects = sum(len(c) for c in children.values())
+        self.stats.record("iterate", iterated - start, objects, memoryview(mote_packet).nbytes)
+        if append(root, 0, children, formatters):
+            root = None
+        iterator.close()
+        self.stats.record("tree", time.perf_counter() - iterated, objects)
+        return root
+
+    def _dict_append_with_children(self, nodes, subject, children, formatters):
+        for obj in children.pop(subject, ()):
+            type, value, buffer = self._xml_format_object(obj, formatters)
+            node = {"tag": type}
+            if value is not None:
+                node["value"] = value
+            if buffer is not None:
+                node["buffer"] = buffer
+            node["children"] = []
+            nodes.append(node)
+            self._dict_append_with_children(node["children"], obj.index, children, formatters)
+
+    def translate_to_dict(self, mote_packet):
+        """
+        Translate the packet into nested dicts without building an ElementTree. Every node has the keys "tag" and
+        "children" (a list of nodes), "value" and "buffer" are present when the element would have those attributes.
+        """
+        root = {"tag": "xml_packet", "children": []}
+        formatters = self.tagdb.lookup_formatters
+        if self.stats is not None:
+            return self._translate_measured(
+                mote_packet, lambda node, subject, children, formatters: self._dict_append_with_children(
+                    node["children"], subject, children, formatters), root, formatters)
+        iterator = self._mle.MLI(mote_packet, copy=False)
+        children = self._xml_index_children(iterator)
+        iterator.close()
+        self._dict_append_with_children(root["children"], 0, children, formatters)
+        return root
+
+    def translate_to_json(self, mote_packet, f=None):
+        """
+        Translate the packet into compact JSON, see translate_to_dict. Returns the JSON string or writes it to
+        the file object f.
+        """
+        packet = self.translate_to_dict(mote_packet)
+        if f is None:
+            return json.dumps(packet, separators=(",", ":"))
+        json.dump(packet, f, separators=(",", ":"))
+
+    def decode_packet(self, mote_packet):
+        """
+        Decode the packet into a compact DecodedPacket that refers to the packet data instead of copying it.
+        """
+        return DecodedPacket(mote_packet, self._mle.MLI)
+
+    def compile_query(self, paths):
+        """
+        Resolve tag name paths like "dt_subscription/dt_seq" to type codes for query, "*" matches any tag.
+        Paths start from the top level of the packet. Raises ValueError for unknown tags.
+        """
+        types = []
+        known = self.tagdb.codes
+        for path in paths:
+            codes = []
+            for tag in path.strip("/").split("/"):
+                if tag == "*":
+                    codes.append(None)
+                elif tag in known:
+                    codes.append(known[tag])
+                else:
+                    raise ValueError("tag %s is unknown" % tag)
+            types.append(tuple(codes))
+        return PacketQuery(tuple(paths), tuple(types))
+
+    def query(self, mote_packet, paths):
+        """
+        Extract the objects matching the paths (see compile_query) without building a tree or formatting values.
+        paths is a PacketQuery or a sequence of paths, which are compiled once and cached.
+
+        Returns a dict with a list per path of the value (an int) of every matching object, or its buffer (bytes)
+        if the object has no value, or None if it has neither. Only objects on a matching branch are looked at.
+        """
+        if not isinstance(paths, PacketQuery):
+            key = tuple(paths)
+            queries = self._queries
+            if key not in queries:
+                queries[key] = self.compile_query(key)
+            paths = queries[key]
+
+        results = {}
+        for path in paths.paths:
+            results[path] = []
+        lists = [results[path] for path in paths.paths]
+        types = paths.types
+
+        # Subject index -> (path number, depth) for the objects on a matching branch
+        active = {0: [(i, 0) for i in range(len(types)) if types[i]]}
+        iterator = self._mle.MLI(mote_packet, copy=False)
+        obj = iterator.next()
+        while obj is not None:
+            states = active.get(obj.subject)
+            if states is not None:
+                type = obj.type & 0xffffffff
+                branches = []
+                for i, depth in states:
+                    code = types[i][depth]
+                    if code is None or code == type:
+                        if depth + 1 == len(types[i]):
+                            if obj.valueIsPresent:
+                                lists[i].append(obj.value)
+                            elif obj.bufferLength > 0:
+                                lists[i].append(obj.getBuffer())
+                            else:
+                                lists[i].append(None)
+                        else:
+                            branches.append((i, depth + 1))
+                if branches:
+                    active[obj.index] = branches
+            obj = iterator.next()
+        iterator.close()
+
+        return results
+
+    def translate_many(self, mote_packets, flat=False):
+        """
+        Translate an iterable of packets, a single iterator is reused for the whole batch.
+
+        Returns a list with an element (or None) per packet or, if flat is set, a list of records per packet.
+        Records are (index, subject, tag, value, buffer) tuples in packet order, value and buffer are the strings
+        translate_to_xml would use for the attributes or None.
+        """
+        if flat:
+            translate = self._xml_records
+        else:
+            translate = self._xml_tree
+
+        results = []
+        iterator = None
+        formatters = self.tagdb.lookup_formatters
+        for mote_packet in mote_packets:
+            if iterator is None:
+                iterator = self._mle.MLI(mote_packet, copy=False)
+            else:
+                iterator.rebind(mote_packet)
+            results.append(translate(iterator, formatters))
+
+        if iterator is not None:
+            iterator.close()
+        return results
+
+    def decode_batch(self, buffer, offsets, flat=False):
+        """
+        Translate packets concatenated into a single buffer, packet i is buffer[offsets[i]:offsets[i + 1]] and
+        the last packet extends to the end of the buffer. See translate_many for the results.
+        """
+        view = memoryview(buffer).cast("B")
+        ends = list(offsets[1:]) + [len(view)]
+        return self.translate_many((view[start:end] for start, end in zip(offsets, ends)), flat)
+
     def _printchildren(self, element, depth):
         known = ""
         value = ""
-        if element.tag not in self._tagdbstr:
+        if element.tag not in self.tagdb.codes:
             known = "(UNKNOWN TAG)"
 
         if element.get("value") is not None:
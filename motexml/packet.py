@@ -0,0 +1,149 @@
+"""packet.py: Decoded MoteXML packets."""
+from array import array
+
+from motexml import mle
+from motexml.mlo import MLObject
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class DecodedPacket(object):
+    """
+    A decoded packet stored column-wise: index, type, subject, value, valueIsPresent, bufferOffset and
+    bufferLength are typed arrays with an entry per object and buffers stay in the packet data, so an object
+    takes 25 bytes instead of a few hundred for an MLObject.
+    """
+
+    __slots__ = ("data", "index", "type", "subject", "value", "valueIsPresent", "bufferOffset", "bufferLength")
+
+    def __init__(self, data, mli=None):
+        """
+        Decode data, a buffer-protocol object that is referenced, not copied. mli is the iterator class to use,
+        mle.MLI by default.
+        """
+        if mli is None:
+            mli = mle.MLI
+        self.data = data
+        iterator = mli(data, copy=False)
+        self._load(iterator)
+        iterator.close()
+
+    @classmethod
+    def from_iterator(cls, iterator, data):
+        """Create the packet from the objects the iterator returns, data is the packet being iterated."""
+        packet = cls.__new__(cls)
+        packet.data = data
+        packet._load(iterator)
+        return packet
+
+    def _load(self, iterator):
+        self.index = array("I")
+        self.type = array("I")
+        self.subject = array("I")
+        self.value = array("i")
+        self.valueIsPresent = array("B")
+        self.bufferOffset = array("I")
+        self.bufferLength = array("I")
+
+        obj = iterator.next()
+        while obj is not None:
+            self.index.append(obj.index)
+            self.type.append(obj.type & 0xFFFFFFFF)
+            self.subject.append(obj.subject)
+            if obj.valueIsPresent:
+                self.value.append(obj.value)
+                self.valueIsPresent.append(1)
+            else:
+                self.value.append(0)
+                self.valueIsPresent.append(0)
+            if obj.bufferLength > 0:
+                self.bufferOffset.append(obj.bufferOffset)
+            else:
+                self.bufferOffset.append(0)
+            self.bufferLength.append(obj.bufferLength)
+            obj = iterator.next()
+
+    def __len__(self):
+        return len(self.index)
+
+    def getBuffer(self, i):
+        """Return the buffer of the i-th object as a memoryview slice of the packet, None if it has no buffer."""
+        length = self.bufferLength[i]
+        if length == 0:
+            return None
+        offset = self.bufferOffset[i]
+        return memoryview(self.data).cast("B")[offset:offset + length]
+
+    def __getitem__(self, i):
+        """Return the i-th object (in packet order) as an MLObject."""
+        mlobject = MLObject()
+        mlobject.index = self.index[i]
+        mlobject.type = self.type[i]
+        mlobject.subject = self.subject[i]
+        if self.valueIsPresent[i]:
+            mlobject.setValue(self.value[i])
+        if self.bufferLength[i] > 0:
+            mlobject.buffer = self.getBuffer(i)
+            mlobject.bufferLength = self.bufferLength[i]
+            mlobject.bufferOffset = self.bufferOffset[i]
+        return mlobject
+
+    def __iter__(self):
+        for i in range(len(self.index)):
+            yield self[i]
+
+
+class MLIndex(DecodedPacket):
+    """
+    A DecodedPacket with lookups by object index, subject and type, see MLI.build_index. get is O(1),
+    children and find are O(k) in the number of objects returned.
+    """
+
+    __slots__ = ("_children", "_types")
+
+    def _load(self, iterator):
+        DecodedPacket._load(self, iterator)
+        children = {}
+        types = {}
+        for index, subject, type in zip(self.index, self.subject, self.type):
+            if subject in children:
+                children[subject].append(index)
+            else:
+                children[subject] = array("I", (index,))
+            if type in types:
+                types[type].append(index)
+            else:
+                types[type] = array("I", (index,))
+        self._children = children
+        self._types = types
+
+    def row(self, index):
+        """Return the position of the object with the index, None if there is no such object."""
+        # Objects are numbered from 1 in packet order
+        if 0 < index <= len(self.index) and self.index[index - 1] == index:
+            return index - 1
+        return None
+
+    def get(self, index):
+        """Return the object with the index as an MLObject, None if there is no such object."""
+        row = self.row(index)
+        if row is None:
+            return None
+        return self[row]
+
+    def childIndexes(self, subject):
+        """Return the indexes of the objects whose subject is the given index."""
+        return self._children.get(subject, ())
+
+    def children(self, subject):
+        """Return the objects whose subject is the given index, 0 for the top level objects."""
+        return [self[index - 1] for index in self._children.get(subject, ())]
+
+    def typeIndexes(self, type):
+        """Return the indexes of the objects of the type."""
+        return self._types.get(type, ())
+
+    def find(self, type):
+        """Return the objects of the type."""
+        return [self[index - 1] for index in self._types.get(type, ())]
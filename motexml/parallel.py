@@ -0,0 +1,137 @@
+"""parallel.py: Translating packets on a pool of workers.
+
+Thread safety: a MoteXMLTranslator may be shared by any number of threads, every translation uses its own
+iterator or a pooled encoder and the tag database is immutable. MLE, MLI and DecodedPacket instances are not
+thread-safe and must stay in one thread. The ctypes backend has no shared state besides the library handle,
+libmlformat only touches the structures passed to it and ctypes releases the GIL for the duration of each call.
+As the rest of the translation is Python code holding the GIL, threads mostly help when packets come from
+blocking sources, processes are needed to decode on several cores.
+"""
+from collections import deque
+from concurrent import futures
+import itertools
+import os
+
+from motexml.motexml import MoteXMLTranslator
+from motexml.tagdb import TagDatabase
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+_translator = None
+
+
+def _init_worker(tagdb, backend):
+    global _translator
+    _translator = MoteXMLTranslator(backend=backend, tagdb=tagdb)
+
+
+def _translate_batch(method, items, translator=None):
+    if translator is None:
+        translator = _translator
+    if callable(method):
+        return [method(translator, item) for item in items]
+    function = getattr(translator, method)
+    return [function(item) for item in items]
+
+
+def batches(iterable, size):
+    """
+    Yield lists of size items. If the iterable raises an exception, the items read before it are yielded first.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = []
+        try:
+            batch.extend(itertools.islice(iterator, size))
+        except Exception:
+            if batch:
+                yield batch
+            raise
+        if not batch:
+            return
+        yield batch
+
+
+class ParallelTranslator(object):
+    """
+    Spread packets over a pool of worker threads or processes in batches, results come back in input order.
+    Workers share one TagDatabase, given as tagdb or loaded from filename.
+    """
+
+    def __init__(self, filename=None, tagdb=None, backend=None, workers=None, processes=True, batch=64):
+        if filename is not None:
+            tagdb = TagDatabase.from_files([filename], tagdb)
+        elif tagdb is None:
+            tagdb = TagDatabase()
+
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.batch = batch
+        self._pending = []  # The futures of the maps in progress
+        if processes:
+            self._translator = None
+            self._executor = futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                         initargs=(tagdb, backend))
+        else:
+            self._translator = MoteXMLTranslator(backend=backend, tagdb=tagdb)
+            self._executor = futures.ThreadPoolExecutor(self.workers)
+
+    def map(self, items, method="translate_to_xml"):
+        """
+        Yield translator.method(item) for every item, in order. method is a translator method name or a function
+        called as method(translator, item), module-level for process workers. At most two batches per worker are
+        in flight, so memory use does not depend on the length of the input. If reading the items raises an
+        exception, the results of the items read before it are yielded first.
+        """
+        chunks = batches(items, self.batch)
+        pending = deque()
+        error = None
+        self._pending.append(pending)
+        try:
+            while True:
+                while error is None and len(pending) < 2 * self.workers:
+                    try:
+                        batch = next(chunks)
+                    except StopIteration:
+                        break
+                    except Exception as e:
+                        error = e
+                        break
+                    if self.processes:
+                        # memoryviews can't be pickled
+                        batch = [bytes(p) if isinstance(p, memoryview) else p for p in batch]
+                    pending.append(self._executor.submit(_translate_batch, method, batch, self._translator))
+                if not pending:
+                    if error is not None:
+                        raise error
+                    return
+                for result in pending.popleft().result():
+                    yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            self._pending.remove(pending)
+
+    def translate_to_xml(self, packets):
+        return self.map(packets, "translate_to_xml")
+
+    def translate_to_dict(self, packets):
+        return self.map(packets, "translate_to_dict")
+
+    def translate_from_xml(self, elements):
+        return self.map(elements, "translate_from_xml")
+
+    def close(self):
+        """Stop the workers, batches of unfinished maps that have not started are dropped."""
+        for pending in self._pending:
+            for future in pending:
+                future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,69 @@
+"""stats.py: Translation statistics."""
+from contextlib import contextmanager
+import threading
+import time
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class Stats(object):
+    """
+    Cumulative per-stage timings and event counters, shared safely between threads. Give one to a
+    MoteXMLTranslator (stats=) to have it record its stages:
+
+        collect     reading the XML elements and parsing their values into objects
+        encode      encoding the objects with MLE, bytes are the encoded packet
+        stream      parsing and encoding a packet with iter_translate_from_xml
+        iterate     reading the objects of a packet with MLI, bytes are the packet
+        tree        building the ElementTree or dicts from the objects
+
+    and the counters unknown_types (objects of types missing from the tag database) and encode_failures.
+    The hook, if given, is called with (stage, seconds, objects, bytes) for every recorded stage.
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+
+    def record(self, stage, seconds, objects=0, size=0):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = [0, 0.0, 0, 0]
+            s[0] += 1
+            s[1] += seconds
+            s[2] += objects
+            s[3] += size
+        if self.hook is not None:
+            self.hook(stage, seconds, objects, size)
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    @contextmanager
+    def measure(self, stage, objects=0, size=0):
+        """Record the time spent in a with block, for stages outside the translator, such as xml_to_string."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, objects, size)
+
+    def snapshot(self):
+        """
+        Return {"stages": {stage: {"calls", "seconds", "objects", "bytes"}}, "counters": {counter: count}},
+        a copy that does not change with further recording.
+        """
+        with self._lock:
+            stages = {}
+            for stage, (calls, seconds, objects, size) in self._stages.items():
+                stages[stage] = {"calls": calls, "seconds": seconds, "objects": objects, "bytes": size}
+            return {"stages": stages, "counters": dict(self._counters)}
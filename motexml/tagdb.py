@@ -0,0 +1,242 @@
+"""tagdb.py: dt_types tag database files."""
+from collections import namedtuple
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from types import MappingProxyType
+
+import logging
+log = logging.getLogger(__name__)
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+# Bumped when the parsing rules or the cache layout change
+CACHE_VERSION = 1
+
+TagEntry = namedtuple("TagEntry", ("code", "name", "comment", "repr"))
+
+
+def parse(lines, filename="<input>"):
+    """
+    Parse dt_types lines: "XX,name[,repr] # comment". XX is the hex code, repr a %-format string for the value
+    or "dt_types" if the value is another type, "%i" by default. Raises ValueError if a code is not hex.
+    """
+    entries = []
+    for lnum, line in enumerate(lines, 1):
+        line = line.strip()
+        split = line.split("#", 1)
+        line = split[0].rstrip()
+        if not line:
+            continue
+
+        comment = None
+        if len(split) > 1:
+            comment = split[1].strip() or None
+
+        tokens = re.findall(r'[\w|%]+', line)
+        if len(tokens) < 2:
+            continue
+        if len(tokens) > 3:
+            log.warning("%s line %u not formatted correctly: \"%s\"", filename, lnum, line)
+
+        try:
+            code = int(tokens[0], 16)
+        except ValueError:
+            raise ValueError("%s line %u: unable to parse \"%s\"" % (filename, lnum, line))
+
+        repr = "%i"
+        if len(tokens) >= 3:
+            if tokens[2] == "dt_types":
+                repr = tokens[2]
+            else:
+                try:
+                    tokens[2] % (0)
+                    repr = tokens[2]
+                except (TypeError, ValueError):
+                    log.error("%s line %u: Cannot use \"%s\" as formatting string", filename, lnum, tokens[2])
+
+        entries.append(TagEntry(code, tokens[1], comment, repr))
+
+    return entries
+
+
+def read(filename):
+    with open(filename, "r") as f:
+        return parse(f, filename)
+
+
+def cache_dir():
+    """The cache directory, MOTEXML_CACHE_DIR or motexml in the XDG cache directory."""
+    if "MOTEXML_CACHE_DIR" in os.environ:
+        return os.environ["MOTEXML_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "motexml")
+
+
+def cache_path(filename, directory=None):
+    if directory is None:
+        directory = cache_dir()
+    digest = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()
+    return os.path.join(directory, "dt_types-%s.json" % digest)
+
+
+def load(filename, cache=True, directory=None):
+    """
+    Read a dt_types file, using the parsed form cached in directory (cache_dir() by default) while the file's
+    modification time and size stay the same. Failing to read or write the cache is not an error.
+    """
+    if not cache:
+        return read(filename)
+
+    st = os.stat(filename)
+    key = [CACHE_VERSION, st.st_mtime_ns, st.st_size]
+    path = cache_path(filename, directory)
+    try:
+        with open(path, "r") as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return [TagEntry(*e) for e in cached["entries"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    entries = read(filename)
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "entries": entries}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError as e:
+        log.debug("unable to cache %s: %s", filename, e)
+    return entries
+
+
+class TagDatabase(object):
+    """
+    An immutable tag database, safe to share between any number of translators and threads.
+    names maps codes to tag names, codes names to codes and reprs codes to value formatting strings.
+    formatters maps codes to (name, function formatting a value as the value attribute string).
+    Type 0 is always dt_none.
+    """
+
+    def __init__(self, entries=()):
+        names = {0: "dt_none"}
+        codes = {"dt_none": 0}
+        reprs = {}
+        self._entries = tuple(e if isinstance(e, TagEntry) else TagEntry(*e) for e in entries)
+        for entry in self._entries:
+            names[entry.code] = entry.name
+            codes[entry.name] = entry.code
+            reprs[entry.code] = entry.repr
+
+        def dt_types(value):
+            name = names.get(value)
+            if name is None:
+                return "0x%X" % (value)
+            return name
+
+        formatters = {}
+        for code, name in names.items():
+            repr = reprs.get(code, "%i")
+            if repr == "%i":
+                formatters[code] = (name, str)
+            elif repr == "dt_types":
+                formatters[code] = (name, dt_types)
+            else:
+                formatters[code] = (name, repr.__mod__)
+        self.names = MappingProxyType(names)
+        self.codes = MappingProxyType(codes)
+        self.reprs = MappingProxyType(reprs)
+        self.formatters = MappingProxyType(formatters)
+        # The plain dict behind formatters for the decoder's per-object lookup, must not be modified
+        self.lookup_formatters = formatters
+
+    def __reduce__(self):
+        return TagDatabase, (self._entries,)
+
+    @classmethod
+    def from_file(cls, filename, cache=True):
+        return cls(load(filename, cache))
+
+    @classmethod
+    def from_files(cls, filenames, base=None, cache=True):
+        """
+        Return a database of the entries of base (if given) and the files, later entries replace earlier ones
+        with the same code or name. The database is built once, however many sources there are.
+        """
+        entries = base.entries if base is not None else ()
+        for filename in filenames:
+            entries += tuple(load(filename, cache))
+        return cls(entries)
+
+    @property
+    def entries(self):
+        return self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def merge(self, other):
+        """Return a database with the entries of other added, they replace entries with the same code or name."""
+        return TagDatabase(self._entries + other.entries)
+
+
+class TagFileWatcher(object):
+    """
+    Poll tag files from a background thread and call callback with a TagDatabase of all of them merged onto base
+    whenever one changes. A file that fails to parse is logged and the previous database stays in use.
+    """
+
+    def __init__(self, filenames, callback, interval=5.0, base=None):
+        self.filenames = list(filenames)
+        self.interval = interval
+        self._callback = callback
+        self._base = base if base is not None else TagDatabase()
+        self._stats = self._stat()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="TagFileWatcher")
+        self._thread.daemon = True
+
+    def _stat(self):
+        stats = []
+        for filename in self.filenames:
+            try:
+                st = os.stat(filename)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stats.append(None)
+        return stats
+
+    def check(self):
+        """Reload now if a file has changed, returns the new TagDatabase or None."""
+        stats = self._stat()
+        if stats == self._stats or None in stats:
+            return None
+        try:
+            database = TagDatabase.from_files(self.filenames, self._base)
+        except (OSError, ValueError) as e:
+            log.error("reloading tag database failed: %s", e)
+            return None
+        self._stats = stats
+        log.info("reloaded tag database, %u types", len(database))
+        self._callback(database)
+        return database
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
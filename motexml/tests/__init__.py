@@ -0,0 +1,9 @@
+"""Tests keep the parsed tag database cache in a temporary directory instead of the user's cache."""
+import atexit
+import os
+import shutil
+import tempfile
+
+_cache = tempfile.mkdtemp(prefix="motexml-test-cache-")
+os.environ["MOTEXML_CACHE_DIR"] = _cache
+atexit.register(shutil.rmtree, _cache, True)
@@ -0,0 +1,55 @@
+"""Test asyncio packet streams."""
+import asyncio
+from codecs import encode
+from concurrent.futures import ThreadPoolExecutor
+import socket
+from unittest import TestCase
+
+from motexml import aio
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+from motexml.tests.test_bytes_to_xml import DT_TYPES, PACKET_1, XML_1
+from motexml.tests.test_parallel import packets
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class AsyncStreamTester(TestCase):
+    """Test decoding packets from a socket pair."""
+
+    def setUp(self):
+        self.translator = MoteXMLTranslator(DT_TYPES)
+
+    def decode(self, data, framing, **kwargs):
+        """Send data from one end of a socket pair and decode it on the other."""
+        async def run():
+            left, right = socket.socketpair()
+            reader, receiver = await asyncio.open_connection(sock=left)
+            _, writer = await asyncio.open_connection(sock=right)
+            writer.write(data)
+            await writer.drain()
+            writer.close()
+            try:
+                return [r async for r in aio.decode_stream(reader, self.translator.translate_to_string, framing,
+                                                           **kwargs)]
+            finally:
+                receiver.close()
+        return asyncio.run(run())
+
+    def test_binary(self):
+        """Length-prefixed packets, a truncated packet raises ValueError."""
+        data = b"\x00\x49" + PACKET_1
+        self.assertEqual(self.decode(data * 2, "binary"), [XML_1, XML_1])
+        self.assertRaises(ValueError, self.decode, data[:-1], "binary")
+
+    def test_hex(self):
+        """Hex lines with a comment."""
+        data = b"# capture\n" + encode(PACKET_1, "hex") + b"\n"
+        self.assertEqual(self.decode(data, "hex"), [XML_1])
+
+    def test_executor(self):
+        """Packets decoded in a thread pool come back in order."""
+        data = b"".join(len(p).to_bytes(2, "big") + p for p in packets(200))
+        expected = [xml_to_string(self.translator.translate_to_xml(p)) for p in packets(200)]
+        with ThreadPoolExecutor(4) as executor:
+            self.assertEqual(self.decode(data, "binary", executor=executor, concurrency=8), expected)
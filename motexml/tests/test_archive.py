@@ -0,0 +1,116 @@
+"""Test packet capture archives."""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from motexml import archive as archive_module
+from motexml.archive import Archive, ArchiveWriter, index_path
+from motexml.framing import read_length_prefixed
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+from motexml.tests.test_bytes_to_xml import DT_TYPES, PACKET_1, XML_1
+from motexml.tests.test_parallel import packets
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class ArchiveTester(TestCase):
+    """Test writing, querying and recovering archives."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "capture.mla")
+        self.packets = packets(10)
+        with ArchiveWriter(self.path) as writer:
+            for i, packet in enumerate(self.packets):
+                writer.append(packet, 1000.0 + i)
+            writer.append(PACKET_1, 2000.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read(self):
+        """Packets are read back, scanned by time and found by top-level type."""
+        with Archive(self.path) as archive:
+            self.assertEqual(len(archive), 11)
+            self.assertEqual([bytes(p) for t, p in archive.scan()], self.packets + [PACKET_1])
+            self.assertEqual([t for t, p in archive.scan(1003.0, 1005.0)], [1003.0, 1004.0])
+            found = list(archive.find(0x0F))
+            self.assertEqual([t for t, p in found], [2000.0])
+            self.assertEqual(xml_to_string(MoteXMLTranslator(DT_TYPES).translate_to_xml(found[0][1])), XML_1)
+            del found
+
+        with open(self.path, "rb") as f:
+            self.assertEqual(list(read_length_prefixed(f))[-1], PACKET_1)
+
+    def test_recover(self):
+        """A partial packet is dropped on append, a missing index is rebuilt."""
+        with open(self.path, "ab") as f:
+            f.write(b"\x00\x05\x09")
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(writer.append(self.packets[0], 3000.0), 11)
+        with Archive(self.path) as archive:
+            self.assertEqual(bytes(archive[11]), self.packets[0])
+
+        os.remove(index_path(self.path))
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(len(writer), 12)
+        with Archive(self.path) as archive:
+            self.assertEqual(bytes(archive[11]), self.packets[0])
+            self.assertEqual(archive.timestamps[11], 0.0)
+
+    def test_unflushed(self):
+        """The index of a writer that was not flushed never points past the data."""
+        writer = ArchiveWriter(self.path)
+        writer.append(self.packets[1], 3000.0)
+        writer._data.flush()  # The data buffer filled up, the writer was killed before flushing the index
+        with Archive(self.path) as archive:
+            self.assertEqual(len(archive), 11)
+        writer.flush()
+        with Archive(self.path) as archive:
+            self.assertEqual(bytes(archive[11]), self.packets[1])
+        writer.close()
+
+    def test_not_closed(self):
+        """Packets written by a writer that was never closed are indexed when the archive is opened again."""
+        writer = ArchiveWriter(self.path)
+        for packet in self.packets:
+            writer.append(packet, 3000.0)
+        # The process exits, the data buffer is flushed and the pending index records are lost
+        writer._data.close()
+        writer._index.close()
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(len(writer), 21)
+            writer.append(PACKET_1, 4000.0)
+        with Archive(self.path) as archive:
+            expected = self.packets + [PACKET_1] + self.packets + [PACKET_1]
+            self.assertEqual([bytes(p) for t, p in archive.scan()], expected)
+            self.assertEqual(list(archive.timestamps[10:]), [2000.0] + [0.0] * 10 + [4000.0])
+
+    def test_flush_interval(self):
+        """Index records are not held back for longer than INDEX_INTERVAL."""
+        interval = archive_module.INDEX_INTERVAL
+        archive_module.INDEX_INTERVAL = 0.0
+        try:
+            with ArchiveWriter(self.path) as writer:
+                writer.append(PACKET_1, 3000.0)
+                with Archive(self.path) as archive:
+                    self.assertEqual(len(archive), 12)
+        finally:
+            archive_module.INDEX_INTERVAL = interval
+
+    def test_truncated_data(self):
+        """Index records of packets missing from the data file are dropped."""
+        size = os.path.getsize(self.path)
+        with open(self.path, "r+b") as f:
+            f.truncate(size - len(PACKET_1) // 2)
+        with Archive(self.path) as archive:
+            self.assertEqual(len(archive), 10)
+        with open(self.path, "r+b") as f:
+            f.truncate(size - len(PACKET_1) - 3)
+        with ArchiveWriter(self.path) as writer:
+            self.assertEqual(len(writer), 9)
+            self.assertEqual(writer.append(PACKET_1, 3000.0), 9)
+        with Archive(self.path) as archive:
+            self.assertEqual([bytes(p) for t, p in archive.scan()], self.packets[:9] + [PACKET_1])
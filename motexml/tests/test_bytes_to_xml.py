@@ -0,0 +1,153 @@
+"""Test bytes to XML conversions."""
+from codecs import decode
+import io
+import json
+import mmap
+import os
+from unittest import TestCase, skipIf
+from xml.etree import ElementTree
+
+from motexml import motexml
+from motexml.motexml import MoteXMLTranslator, write_xml, xml_to_string
+
+try:
+    from motexml import mlctypes
+except OSError:
+    mlctypes = None
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+DT_TYPES = os.path.join(os.path.dirname(__file__), "dt_types.txt")
+
+PACKET_1 = decode(b'080F4A010FE2004A02044D9549036EFE49010F364A05044F0D49066EFD'
+                  b'4901590A090502C809D20800000000000000004A09087C21C8092210F0'
+                  b'63C751A8D44673AF386DF82A9BB942', 'hex')
+
+XML_1 = """<?xml version="1.0" ?>
+<xml_packet>
+    <dt_data>
+        <dt_data value="dt_external_temperature_C">
+            <dt_value value="-27315">
+                <dt_exp value="-2"/>
+            </dt_value>
+        </dt_data>
+        <dt_data value="dt_battery_V">
+            <dt_value value="3407">
+                <dt_exp value="-3"/>
+            </dt_value>
+        </dt_data>
+        <dt_age_ms value="10"/>
+    </dt_data>
+    <dt_subscription value="2">
+        <dt_provider buffer="0000000000000000"/>
+        <dt_seq value="8572"/>
+        <dt_resource buffer="f063c751a8d44673af386df82a9bb942"/>
+    </dt_subscription>
+</xml_packet>"""
+
+
+class BytesToXMLTester(TestCase):
+    """Test binary input to XML output."""
+    backend = None
+
+    def setUp(self):
+        self.translator = MoteXMLTranslator(DT_TYPES, backend=self.backend)
+
+    def test_packet_1(self):
+        """Tests 1st sample packet."""
+        self.assertEqual(xml_to_string(self.translator.translate_to_xml(PACKET_1)), XML_1)
+
+    def test_compact(self):
+        """Compact output has no whitespace between elements, write_xml matches xml_to_string."""
+        element = self.translator.translate_to_xml(PACKET_1)
+        compact = xml_to_string(element, indent=None)
+        self.assertEqual(compact, "".join(line.strip() for line in XML_1.splitlines()))
+        f = io.StringIO()
+        write_xml(element, f)
+        self.assertEqual(f.getvalue(), XML_1)
+
+    def test_attribute_order(self):
+        """Attributes are in insertion order, sorted like minidom sorted them before Python 3.8."""
+        element = ElementTree.Element("xml_packet")
+        ElementTree.SubElement(element, "dt_data", {"value": "1", "buffer": "00"})
+        sort = motexml.SORTED_ATTRIBUTES
+        try:
+            motexml.SORTED_ATTRIBUTES = False
+            self.assertIn('<dt_data value="1" buffer="00"/>', xml_to_string(element))
+            motexml.SORTED_ATTRIBUTES = True
+            self.assertIn('<dt_data buffer="00" value="1"/>', xml_to_string(element))
+        finally:
+            motexml.SORTED_ATTRIBUTES = sort
+
+    def test_namespace(self):
+        """Namespaced names are serialized with prefixes."""
+        element = ElementTree.Element("{urn:x}xml_packet")
+        ElementTree.SubElement(element, "dt_seq", {"{urn:x}value": "1"})
+        self.assertIn('<ns0:xml_packet xmlns:ns0="urn:x">', xml_to_string(element))
+        self.assertIn('<dt_seq ns0:value="1"/>', xml_to_string(element))
+
+    def test_json(self):
+        """JSON output has the same structure and strings as the XML."""
+        packet = json.loads(self.translator.translate_to_json(PACKET_1))
+        self.assertEqual(packet, self.translator.translate_to_dict(PACKET_1))
+        self.assertEqual(packet["tag"], "xml_packet")
+        subscription = packet["children"][1]
+        self.assertEqual((subscription["tag"], subscription["value"]), ("dt_subscription", "2"))
+        self.assertEqual(subscription["children"][0], {"tag": "dt_provider", "buffer": "0000000000000000", "children": []})
+        self.assertEqual(packet["children"][0]["children"][1]["value"], "dt_battery_V")
+
+    def test_query(self):
+        """Queries return raw values and buffers of the matching objects."""
+        result = self.translator.query(PACKET_1, ["dt_subscription/dt_seq", "dt_data/dt_data/dt_value",
+                                                  "*/dt_resource", "dt_data/dt_age_ms/dt_exp"])
+        self.assertEqual(result, {"dt_subscription/dt_seq": [8572],
+                                  "dt_data/dt_data/dt_value": [-27315, 3407],
+                                  "*/dt_resource": [PACKET_1[-16:]],
+                                  "dt_data/dt_age_ms/dt_exp": []})
+        query = self.translator.compile_query(["dt_data/dt_data"])
+        self.assertEqual(self.translator.query(PACKET_1, query), {"dt_data/dt_data": [0xE2, 0x36]})
+        self.assertRaises(ValueError, self.translator.compile_query, ["dt_data/dt_nonexistent"])
+
+    def test_roundtrip(self):
+        """The decoded tree encodes back to the same bytes."""
+        self.assertEqual(self.translator.translate_from_xml(self.translator.translate_to_xml(PACKET_1)), PACKET_1)
+
+    def test_buffer_types(self):
+        """Any buffer-protocol object can be decoded."""
+        m = mmap.mmap(-1, len(PACKET_1))
+        m.write(PACKET_1)
+        for packet in (bytearray(PACKET_1), memoryview(PACKET_1), m):
+            self.assertEqual(xml_to_string(self.translator.translate_to_xml(packet)), XML_1)
+
+    def test_translate_many(self):
+        """Batches give the same trees as single packets."""
+        packets = [PACKET_1, decode(b'0901FF', 'hex'), b'', PACKET_1]
+        expected = [xml_to_string(self.translator.translate_to_xml(p)) for p in packets]
+        self.assertEqual([xml_to_string(e) for e in self.translator.translate_many(packets)], expected)
+        self.assertEqual([xml_to_string(e) for e in self.translator.decode_batch(b''.join(packets), (0, 73, 76, 76))],
+                         expected)
+
+    def test_translate_many_flat(self):
+        """Flat records carry the attribute strings in packet order."""
+        records, = self.translator.translate_many([PACKET_1], flat=True)
+        self.assertEqual(len(records), 12)
+        self.assertEqual(records[1], (2, 1, "dt_data", "dt_external_temperature_C", None))
+        self.assertEqual(records[9], (10, 9, "dt_provider", None, "0000000000000000"))
+
+    def test_unknown_type(self):
+        """Unknown types are named after their code."""
+        xml = xml_to_string(self.translator.translate_to_xml(decode(b'0901FF', 'hex')))
+        self.assertIn('<dt_unknown_00000001 value="-1"/>', xml)
+
+
+class PythonBytesToXMLTester(BytesToXMLTester):
+    """Test binary input to XML output with the pure-Python backend."""
+    backend = "python"
+
+
+@skipIf(mlctypes is None, "libmlformat is not available")
+class CtypesBytesToXMLTester(BytesToXMLTester):
+    """Test binary input to XML output with the libmlformat backend."""
+    backend = "ctypes"
@@ -0,0 +1,72 @@
+"""Test the translation result cache."""
+from unittest import TestCase
+
+from motexml.cache import LRUCache, freeze_tree, frozen_size
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+from motexml.tagdb import TagDatabase
+from motexml.tests.test_bytes_to_xml import DT_TYPES, PACKET_1, XML_1
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class LRUCacheTester(TestCase):
+    """Test eviction and statistics."""
+
+    def test_eviction(self):
+        """Least recently used entries are evicted by count and by size."""
+        cache = LRUCache(entries=2, size=10)
+        cache.put("a", 1, 4)
+        cache.put("b", 2, 4)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3, 4)
+        self.assertIsNone(cache.get("b"))
+        cache.put("d", 4, 8)
+        self.assertIsNone(cache.get("a"))
+        cache.put("e", 5, 11)
+        self.assertEqual(cache.info(), {"hits": 1, "misses": 2, "evictions": 3, "entries": 1, "size": 8})
+
+
+class TranslatorCacheTester(TestCase):
+    """Test a translator with a cache."""
+
+    def setUp(self):
+        self.cache = LRUCache()
+        self.translator = MoteXMLTranslator(DT_TYPES, cache=self.cache)
+
+    def test_decode(self):
+        """Repeated packets hit the cache, callers get trees of their own."""
+        first = self.translator.translate_to_xml(PACKET_1)
+        first[0].tag = "dt_changed"
+        second = self.translator.translate_to_xml(memoryview(PACKET_1))
+        self.assertEqual(xml_to_string(second), XML_1)
+        self.assertIsNot(first, second)
+        self.assertEqual(self.translator.translate_to_string(PACKET_1), XML_1)
+        self.assertEqual(self.translator.translate_to_string(PACKET_1), XML_1)
+        self.assertEqual(self.cache.info()["hits"], 2)
+
+    def test_encode(self):
+        """Encoding results are cached by the content of the tree."""
+        element = self.translator.translate_to_xml(PACKET_1)
+        self.assertEqual(self.translator.translate_from_xml(element), PACKET_1)
+        self.assertEqual(self.translator.translate_from_xml(self.translator.translate_to_xml(PACKET_1)), PACKET_1)
+        element[1][1].set("value", "8573")
+        self.assertNotEqual(self.translator.translate_from_xml(element), PACKET_1)
+        self.assertEqual(self.cache.info()["hits"], 2)
+
+    def test_size(self):
+        """Results are charged by their own size, not by the size of the packet."""
+        element = self.translator.translate_to_xml(PACKET_1)
+        self.assertEqual(self.cache.info()["size"], frozen_size(freeze_tree(element)))
+        self.assertGreater(self.cache.info()["size"], len(PACKET_1))
+        self.cache.clear()
+        self.translator.translate_to_string(PACKET_1)
+        self.assertEqual(self.cache.info()["size"], len(XML_1))
+
+    def test_invalidate(self):
+        """Changing the tag database drops the cached results."""
+        self.translator.translate_to_xml(PACKET_1)
+        self.translator.load_tag_db(DT_TYPES)
+        self.assertEqual(len(self.cache), 0)
+        self.translator.tagdb = TagDatabase()
+        self.assertNotIn("dt_data", xml_to_string(self.translator.translate_to_xml(PACKET_1)))
@@ -0,0 +1,25 @@
+"""Test packet stream framing."""
+import io
+from unittest import TestCase
+
+from motexml import framing
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class FramingTester(TestCase):
+    """Test reading and writing framed packet streams."""
+
+    def test_hex_lines(self):
+        """Comments and empty lines are skipped."""
+        f = io.StringIO(u"# capture\n090102\n\n  0a0B  \n")
+        self.assertEqual(list(framing.read_hex_lines(f)), [b"\x09\x01\x02", b"\x0a\x0b"])
+
+    def test_length_prefixed(self):
+        """Written packets are read back, truncated streams are detected."""
+        f = io.BytesIO()
+        for packet in (b"\x09\x01\x02", b"", b"\x08\x0f"):
+            framing.write_length_prefixed(f, packet)
+        self.assertEqual(list(framing.read_length_prefixed(io.BytesIO(f.getvalue()))), [b"\x09\x01\x02", b"", b"\x08\x0f"])
+        self.assertRaises(ValueError, list, framing.read_length_prefixed(io.BytesIO(f.getvalue()[:-1])))
@@ -0,0 +1,155 @@
+"""Test the MoteXML encoder and iterator backends."""
+from unittest import TestCase, skipIf
+
+from motexml import mle
+from motexml import mlpure
+
+try:
+    from motexml import mlctypes
+except OSError:
+    mlctypes = None
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class MLEncoderTester(TestCase):
+    """Test the encoder and iterator of the pure-Python backend."""
+    backend = "python"
+
+    def setUp(self):
+        self.mle = mle.load_backend(self.backend)
+
+    def test_overflow(self):
+        """Running out of space is detected and reset starts over with a larger buffer."""
+        enc = self.mle.MLE(4)
+        self.assertEqual(enc.appendOSV(0x0F, 0, 1), 1)
+        self.assertEqual(enc.appendOSV(0x0F, 1, 2), 0)
+        self.assertTrue(enc.overflow)
+
+        enc.reset(8)
+        self.assertFalse(enc.overflow)
+        self.assertEqual(enc.appendOSV(0x0F, 0, 1), 1)
+        self.assertEqual(enc.appendOSV(0x0F, 1, 2), 2)
+        self.assertEqual(enc.str(), b'\x09\x0F\x01\x49\x01\x0F\x02')
+
+    def test_append_many(self):
+        """Tuples and parallel sequences encode like single appends."""
+        enc = self.mle.MLE()
+        enc.appendOS(0x0F, 0)
+        enc.appendOSV(0x04, 1, -27315)
+        enc.appendOSV(0x08, 1, 300)
+        mlobject = mle.MLObject()
+        mlobject.type = 0x22
+        mlobject.subject = 3
+        mlobject.setBuffer(b"\x01\x02", 2)
+        enc.appendObject(mlobject)
+        expected = enc.str()
+
+        enc = self.mle.MLE()
+        indexes = enc.append_many([(0x0F, 0, None, None), (0x04, 1, -27315, None), (0x08, 1, 300, b""),
+                                   (0x22, 3, None, b"\x01\x02")])
+        self.assertEqual(list(indexes), [1, 2, 3, 4])
+        self.assertEqual(enc.str(), expected)
+
+        enc = self.mle.MLE()
+        enc.append_many([0x0F, 0x04, 0x08, 0x22], [0, 1, 1, 3], [None, -27315, 300, None], [None, None, None, b"\x01\x02"])
+        self.assertEqual(enc.str(), expected)
+
+        enc = self.mle.MLE(8)
+        self.assertEqual(list(enc.append_many([0x0F, 0x04, 0x08], [0, 1, 1], [None, -27315, 300])), [1, 2])
+        self.assertTrue(enc.overflow)
+
+    def test_value_range(self):
+        """Unsigned 32 bit values wrap around, wider values are rejected instead of truncated."""
+        enc = self.mle.MLE()
+        self.assertEqual(enc.appendOSV(0x0F, 0, 0xFFFFFFFF), 1)
+        self.assertEqual(enc.appendOSV(0x0F, 0, 0x100000000), 0)
+        self.assertEqual(enc.appendOSV(0x0F, 0, -0x80000001), 0)
+        self.assertFalse(enc.overflow)
+        self.assertEqual(self.mle.MLI(enc.str()).next().value, -1)
+
+    def test_limits(self):
+        """Objects the format can not represent fail without being taken for an overflow."""
+        enc = self.mle.MLE()
+        self.assertEqual(enc.appendOS(0x0F, 0x10000), 0)
+        self.assertEqual(enc.appendOSV(0x0F, -1, 1), 0)
+        self.assertEqual(list(enc.append_many([(0x0F, 0, None, b"\x00" * 256)])), [])
+        mlobject = mle.MLObject()
+        mlobject.type = 0x22
+        mlobject.setBuffer(b"\x00" * 256, 256)
+        self.assertEqual(enc.appendObject(mlobject), 0)
+        self.assertFalse(enc.overflow)
+
+    def test_iterate(self):
+        """Objects are numbered in packet order and nextWithSubject skips the others."""
+        enc = self.mle.MLE()
+        enc.appendOS(0x0F, 0)
+        enc.appendOSV(0x04, 1, -27315)
+        enc.appendOSV(0x08, 0, 0x12345678)
+        it = self.mle.MLI(enc.str())
+        obj = it.nextWithSubject(0)
+        self.assertEqual((obj.index, obj.type, obj.valueIsPresent), (1, 0x0F, False))
+        obj = it.nextWithSubject(0)
+        self.assertEqual((obj.index, obj.type, obj.value), (3, 0x08, 0x12345678))
+        self.assertIsNone(it.nextWithSubject(0))
+        it.reset()
+        self.assertEqual(it.next().index, 1)
+
+
+@skipIf(mlctypes is None, "libmlformat is not available")
+class CtypesMLEncoderTester(MLEncoderTester):
+    """Test the encoder and iterator of the libmlformat backend."""
+    backend = "ctypes"
+
+
+@skipIf(mlctypes is None, "libmlformat is not available")
+class WireFormatTester(TestCase):
+    """Test that the pure-Python encoder produces the same bytes as libmlformat."""
+
+    CASES = (
+        (0x0F, 0, None, None),
+        (0x0F, 9, 1, None),
+        (0x0F, 0x100, None, None),  # Two byte subject
+        (0x0F, 0xFFFF, -1, None),
+        (0x1234, 1, None, None),  # Two byte type
+        (0x12345678, 1, None, None),  # Four byte type
+        (0x0F, 1, -0x8000, None),
+        (0x0F, 1, 0x8000, None),  # Four byte value
+        (0x0F, 1, -0x80000000, None),
+        (0x0F, 1, 0x7FFFFFFF, None),
+        (0x0F, 0, None, b"\x01"),
+        (0x0F, 0x1234, 0x12345678, b"\xAA" * 255),  # Everything wide and the longest buffer
+    )
+
+    def test_encode(self):
+        """Every field width encodes to the same bytes."""
+        for type, subject, value, buffer in self.CASES:
+            enc = mlctypes.MLE()
+            self.assertEqual(list(enc.append_many([(type, subject, value, buffer)])), [1])
+            self.assertEqual(mlpure.encode_object(type, subject, value, buffer), enc.str(),
+                             (type, subject, value, buffer))
+
+    def test_cobject(self):
+        """MLObject converts to and from libmlformat objects like the libmlformat-only module did."""
+        mlobject = mle.MLObject()
+        mlobject.type = 0x0F
+        mlobject.subject = 0x1234
+        mlobject.setValue(-5)
+        mlobject.setBuffer(b"\x01\x02", 2)
+        copy = mle.MLObject(mlobject.cObject())
+        self.assertEqual((copy.type, copy.subject, copy.value, copy.valueIsPresent, copy.getBuffer()),
+                         (0x0F, 0x1234, -5, True, b"\x01\x02"))
+
+    def test_decode(self):
+        """Packets of every field width decode to the same objects."""
+        data = b"".join(mlpure.encode_object(*c) for c in self.CASES)
+        python = mlpure.MLI(data)
+        library = mlctypes.MLI(data)
+        for _ in self.CASES:
+            a, b = python.next(), library.next()
+            self.assertEqual((a.index, a.type, a.subject, bool(a.valueIsPresent), a.getBuffer()),
+                             (b.index, b.type, b.subject, bool(b.valueIsPresent), b.getBuffer()))
+            if a.valueIsPresent:
+                self.assertEqual(a.value, b.value)
+        self.assertIsNone(library.next())
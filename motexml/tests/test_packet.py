@@ -0,0 +1,64 @@
+"""Test decoded packets."""
+from unittest import TestCase, skipIf
+
+from motexml import mle
+from motexml.motexml import MoteXMLTranslator
+from motexml.tests.test_bytes_to_xml import DT_TYPES, PACKET_1
+
+try:
+    from motexml import mlctypes
+except OSError:
+    mlctypes = None
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class DecodedPacketTester(TestCase):
+    """Test the columnar packet with the pure-Python backend."""
+    backend = "python"
+
+    def setUp(self):
+        self.translator = MoteXMLTranslator(DT_TYPES, backend=self.backend)
+
+    def test_columns(self):
+        """Columns and objects match what the iterator returns."""
+        data = bytearray(PACKET_1)
+        packet = self.translator.decode_packet(data)
+        self.assertEqual(len(packet), 12)
+        self.assertEqual(list(packet.subject), [0, 1, 2, 3, 1, 5, 6, 1, 0, 9, 9, 9])
+        self.assertEqual(packet.value[2], -27315)
+        self.assertFalse(packet.valueIsPresent[0])
+
+        resource = packet[11]
+        self.assertEqual((resource.index, resource.type, resource.valueIsPresent), (12, 0x22, False))
+        self.assertEqual(resource.getBuffer(), PACKET_1[-16:])
+        self.assertEqual(resource.bufferOffset, len(PACKET_1) - 16)
+
+        data[-1] = 0  # Buffers are views of the packet data
+        self.assertEqual(packet.getBuffer(11)[-1], 0)
+
+    def test_slots(self):
+        """Objects have no __dict__."""
+        packet = self.translator.decode_packet(PACKET_1)
+        self.assertFalse(hasattr(packet[0], "__dict__"))
+        self.assertEqual([o.index for o in packet], list(range(1, 13)))
+
+    def test_index(self):
+        """The index finds objects by index, subject and type."""
+        for copy in (True, False):
+            index = mle.load_backend(self.backend).MLI(PACKET_1, copy=copy).build_index()
+            self.assertEqual(index.get(6).value, 3407)
+            self.assertIsNone(index.get(13))
+            self.assertIsNone(index.get(0))
+            self.assertEqual([o.index for o in index.children(1)], [2, 5, 8])
+            self.assertEqual([o.index for o in index.children(0)], [1, 9])
+            self.assertEqual(index.children(12), [])
+            self.assertEqual([o.value for o in index.find(0x6E)], [-2, -3])
+            self.assertEqual(index.get(12).getBuffer(), PACKET_1[-16:])
+
+
+@skipIf(mlctypes is None, "libmlformat is not available")
+class CtypesDecodedPacketTester(DecodedPacketTester):
+    """Test the columnar packet with the libmlformat backend."""
+    backend = "ctypes"
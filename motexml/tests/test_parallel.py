@@ -0,0 +1,87 @@
+"""Test translating packets in parallel."""
+import threading
+from unittest import TestCase
+
+from motexml.mlpure import encode_object
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+from motexml.parallel import ParallelTranslator
+from motexml.tests.test_bytes_to_xml import DT_TYPES
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+def packets(count):
+    # dt_value objects numbered with their position, a dt_age_ms child every third
+    result = []
+    for i in range(count):
+        data = encode_object(0x04, 0, i)
+        if i % 3 == 0:
+            data += encode_object(0x59, 1, -i)
+        result.append(data)
+    return result
+
+
+def _failing(items):
+    for item in items:
+        yield item
+    raise ValueError("bad packet")
+
+
+class ParallelTranslatorTester(TestCase):
+    """Test ParallelTranslator and sharing a translator between threads."""
+
+    def setUp(self):
+        self.translator = MoteXMLTranslator(DT_TYPES)
+        self.packets = packets(500)
+        self.expected = [xml_to_string(self.translator.translate_to_xml(p)) for p in self.packets]
+
+    def check(self, processes):
+        with ParallelTranslator(DT_TYPES, workers=3, processes=processes, batch=16) as parallel:
+            results = [xml_to_string(e) for e in parallel.translate_to_xml(self.packets)]
+            self.assertEqual(results, self.expected)
+            elements = [self.translator.translate_to_xml(p) for p in self.packets[:20]]
+            self.assertEqual(list(parallel.translate_from_xml(elements)), self.packets[:20])
+
+    def test_threads(self):
+        """Thread pool results are in input order."""
+        self.check(False)
+
+    def test_processes(self):
+        """Process pool results are in input order."""
+        self.check(True)
+
+    def test_input_error(self):
+        """Packets read before an input error are translated before it is raised."""
+        for processes in (False, True):
+            with ParallelTranslator(DT_TYPES, workers=2, processes=processes, batch=16) as parallel:
+                results = []
+                with self.assertRaises(ValueError):
+                    for e in parallel.translate_to_xml(_failing(self.packets[:50])):
+                        results.append(xml_to_string(e))
+                self.assertEqual(results, self.expected[:50])
+
+    def test_close_unfinished(self):
+        """Closing the pool during a map drops the batches that have not started."""
+        parallel = ParallelTranslator(DT_TYPES, workers=2, processes=False, batch=16)
+        results = parallel.translate_to_xml(self.packets)
+        self.assertEqual(xml_to_string(next(results)), self.expected[0])
+        parallel.close()
+        self.assertTrue(all(f.cancelled() or f.done() for pending in parallel._pending for f in pending))
+
+    def test_shared_translator(self):
+        """Threads decoding and encoding with one translator at the same time."""
+        errors = []
+
+        def work():
+            for packet, expected in zip(self.packets, self.expected):
+                element = self.translator.translate_to_xml(packet)
+                if xml_to_string(element) != expected or self.translator.translate_from_xml(element) != packet:
+                    errors.append(packet)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
@@ -0,0 +1,51 @@
+"""Test translation statistics."""
+from codecs import decode
+from unittest import TestCase
+
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+from motexml.stats import Stats
+from motexml.tests.test_bytes_to_xml import DT_TYPES, PACKET_1, XML_1
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class StatsTester(TestCase):
+    """Test the stages and counters recorded by a translator."""
+
+    def setUp(self):
+        self.calls = []
+        self.stats = Stats(hook=lambda *args: self.calls.append(args))
+        self.translator = MoteXMLTranslator(DT_TYPES, stats=self.stats)
+
+    def test_decode(self):
+        """Results are the same with stats, iterate and tree are recorded."""
+        element = self.translator.translate_to_xml(PACKET_1)
+        self.assertEqual(xml_to_string(element), XML_1)
+        self.assertEqual(self.translator.translate_to_dict(PACKET_1),
+                         MoteXMLTranslator(DT_TYPES).translate_to_dict(PACKET_1))
+        with self.stats.measure("xml_to_string"):
+            xml_to_string(element)
+
+        stages = self.stats.snapshot()["stages"]
+        self.assertEqual(stages["iterate"]["calls"], 2)
+        self.assertEqual(stages["iterate"]["objects"], 2 * 12)
+        self.assertEqual(stages["iterate"]["bytes"], 2 * len(PACKET_1))
+        self.assertEqual(stages["tree"]["calls"], 2)
+        self.assertEqual(stages["xml_to_string"]["calls"], 1)
+        self.assertEqual([c[0] for c in self.calls], ["iterate", "tree", "iterate", "tree", "xml_to_string"])
+
+    def test_encode(self):
+        """Encoding records collect and encode, failures and unknown types are counted."""
+        element = self.translator.translate_to_xml(PACKET_1)
+        self.assertEqual(self.translator.translate_from_xml(element), PACKET_1)
+        element[0].tag = "dt_missing"
+        self.assertIsNone(self.translator.translate_from_xml(element))
+        self.translator.translate_to_xml(decode(b'0901FF', 'hex'))
+
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["stages"]["encode"]["bytes"], len(PACKET_1))
+        self.assertEqual(snapshot["stages"]["collect"]["objects"], 12)
+        self.assertEqual(snapshot["counters"], {"encode_failures": 1, "unknown_types": 1})
+        self.stats.reset()
+        self.assertEqual(self.stats.snapshot(), {"stages": {}, "counters": {}})
@@ -0,0 +1,88 @@
+"""Test the tag database loader."""
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+
+from motexml import tagdb
+from motexml.motexml import MoteXMLTranslator
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+class TagDbTester(TestCase):
+    """Test parsing dt_types files and the parsed form cache."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "dt_types.txt")
+        with open(self.filename, "w") as f:
+            f.write("# header\n04,dt_value # a value\n36, dt_battery_V, %x\n0F,dt_types,dt_types\n22,dt_resource,%q\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse(self):
+        """Comments, reprs and invalid formatting strings."""
+        self.assertEqual(tagdb.read(self.filename), [
+            (0x04, "dt_value", "a value", "%i"),
+            (0x36, "dt_battery_V", None, "%x"),
+            (0x0F, "dt_types", None, "dt_types"),
+            (0x22, "dt_resource", None, "%i")])
+        self.assertRaises(ValueError, tagdb.parse, ["XY,dt_bad"])
+
+    def test_watch(self):
+        """A watching translator picks up changed files, unknown type warnings are rate-limited."""
+        translator = MoteXMLTranslator(self.filename)
+        watcher = translator.watch(interval=3600)
+        try:
+            with self.assertLogs("motexml.motexml", "WARNING") as logs:
+                for _ in range(3):
+                    translator.translate_to_xml(b"\x09\x59\x01")
+            self.assertEqual(len(logs.output), 1)
+            self.assertIsNone(watcher.check())
+
+            with open(self.filename, "a") as f:
+                f.write("59,dt_age_ms\n")
+            self.assertIsNotNone(watcher.check())
+            self.assertEqual(translator.tagdb.names[0x59], "dt_age_ms")
+            self.assertEqual(translator.translate_to_xml(b"\x09\x59\x01")[0].tag, "dt_age_ms")
+        finally:
+            translator.unwatch()
+
+    def test_cache(self):
+        """The cached form is used until the file changes."""
+        cache = os.path.join(self.directory, "cache")
+        entries = tagdb.load(self.filename, directory=cache)
+        self.assertTrue(os.path.exists(tagdb.cache_path(self.filename, cache)))
+        self.assertEqual(tagdb.load(self.filename, directory=cache), entries)
+
+        with open(self.filename, "a") as f:
+            f.write("59,dt_age_ms\n")
+        self.assertEqual(tagdb.load(self.filename, directory=cache)[-1], (0x59, "dt_age_ms", None, "%i"))
+
+
+class TagDatabaseTester(TestCase):
+    """Test the shared tag database."""
+
+    def setUp(self):
+        self.db = tagdb.TagDatabase([(0x04, "dt_value", None, "%i"), (0x36, "dt_battery_V", None, "%x")])
+
+    def test_mappings(self):
+        """The mappings are read-only and dt_none is always present."""
+        self.assertEqual(self.db.names[0x36], "dt_battery_V")
+        self.assertEqual(self.db.codes["dt_none"], 0)
+        self.assertEqual(self.db.reprs[0x36], "%x")
+        self.assertEqual(self.db.formatters[0x36][1](255), "ff")
+        self.assertEqual(self.db.formatters[0x04][1](-3), "-3")
+        with self.assertRaises(TypeError):
+            self.db.names[0x05] = "dt_subscription"
+
+    def test_translators(self):
+        """Translators share the database, loading a file replaces only the translator's own reference."""
+        t1 = MoteXMLTranslator(tagdb=self.db)
+        t2 = MoteXMLTranslator(tagdb=self.db)
+        self.assertIs(t1.tagdb, t2.tagdb)
+        self.assertEqual(pickle.loads(pickle.dumps(self.db)).names, self.db.names)
@@ -0,0 +1,87 @@
+"""Test the stream modes of the command line tools."""
+from argparse import Namespace
+from codecs import encode
+import io
+import sys
+from unittest import TestCase
+from unittest import mock
+
+from motexml import framing
+from motexml.motexml import MoteXMLTranslator, xml_to_string
+from motexml.tests.test_bytes_to_xml import DT_TYPES
+from motexml.tests.test_parallel import packets
+from motexml.tools import mlhextoxml, xmltomlhex
+
+__author__ = "Raido Pahtma"
+__license__ = "MIT"
+
+
+def run(function, args, data):
+    """Call function(args) with data on stdin, returns (status, stdout bytes, stderr text)."""
+    stdin = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding="utf-8", newline="\n")
+    stderr = io.StringIO()
+    with mock.patch.object(sys, "stdin", stdin), mock.patch.object(sys, "stdout", stdout), \
+            mock.patch.object(sys, "stderr", stderr):
+        status = function(args)
+        stdout.flush()
+    return status, stdout.buffer.getvalue(), stderr.getvalue()
+
+
+class StreamToolsTester(TestCase):
+    """Test mlhextoxml and xmltomlhex --stream with both framings and worker counts."""
+
+    def setUp(self):
+        translator = MoteXMLTranslator(DT_TYPES)
+        self.packets = packets(40)
+        self.documents = [xml_to_string(translator.translate_to_xml(p)) for p in self.packets]
+
+    def to_xml(self, data, format, jobs):
+        return run(mlhextoxml.stream, Namespace(input="-", format=format, types=DT_TYPES, jobs=jobs), data)
+
+    def from_xml(self, data, format, jobs):
+        return run(xmltomlhex.stream, Namespace(filename="-", format=format, types=DT_TYPES, jobs=jobs), data)
+
+    def test_to_xml(self):
+        """Packets are translated in order from hex lines and length-prefixed binary."""
+        hexdata = b"# comment\n" + b"".join(encode(p, "hex") + b"\n" for p in self.packets)
+        binary = io.BytesIO()
+        for p in self.packets:
+            framing.write_length_prefixed(binary, p)
+        expected = "".join(d + "\n" for d in self.documents).encode("utf-8")
+        for jobs in (1, 2):
+            self.assertEqual(self.to_xml(hexdata, "hex", jobs), (0, expected, ""))
+            self.assertEqual(self.to_xml(binary.getvalue(), "binary", jobs), (0, expected, ""))
+
+    def test_to_xml_error(self):
+        """The packets before bad input are translated, then the tool fails."""
+        hexdata = b"".join(encode(p, "hex") + b"\n" for p in self.packets[:3]) + b"zz\n"
+        expected = "".join(d + "\n" for d in self.documents[:3]).encode("utf-8")
+        for jobs in (1, 2):
+            status, output, errors = self.to_xml(hexdata, "hex", jobs)
+            self.assertEqual((status, output), (1, expected))
+            self.assertIn("line 4", errors)
+            status, output, errors = self.to_xml(b"\x00\x05\x09", "binary", jobs)
+            self.assertEqual((status, output), (1, b""))
+
+    def test_from_xml(self):
+        """Packet elements are encoded in order to hex lines and length-prefixed binary."""
+        document = "<packets>%s</packets>" % "".join(d.split("?>", 1)[1] for d in self.documents)
+        document = document.encode("utf-8")
+        binary = io.BytesIO()
+        for p in self.packets:
+            framing.write_length_prefixed(binary, p)
+        for jobs in (1, 2):
+            self.assertEqual(self.from_xml(document, "hex", jobs),
+                             (0, b"".join(encode(p, "hex") + b"\n" for p in self.packets), ""))
+            self.assertEqual(self.from_xml(document, "binary", jobs), (0, binary.getvalue(), ""))
+
+    def test_from_xml_error(self):
+        """Packets that can't be encoded are reported, malformed XML fails the tool."""
+        document = b"<packets><xml_packet><dt_bad/></xml_packet><xml_packet/></packets>"
+        for jobs in (1, 2):
+            status, output, errors = self.from_xml(document, "hex", jobs)
+            self.assertEqual((status, output), (0, b"\n"))
+            self.assertIn("packet 0 translation failed", errors)
+            status, output, errors = self.from_xml(b"<packets><xml_packet>", "hex", jobs)
+            self.assertEqual(status, 1)
@@ -1,23 +1,29 @@
 """Test XML to bytes conversions."""
 from codecs import decode
+import io
 import os
-from unittest import TestCase
+from unittest import TestCase, skipIf
 from xml.etree import ElementTree
 
 from motexml.motexml import MoteXMLTranslator
 
+try:
+    from motexml import mlctypes
+except OSError:
+    mlctypes = None
+
 __author__ = "Kaarel Ratas"
 __license__ = "MIT"
 
 
 class XMLToBytesTester(TestCase):
     """Test XML input to binary output."""
+    backend = None
+
     def setUp(self):
-        # TODO: package dt_types.txt with this package somehow
-        if 'DT_TYPES' in os.environ:
-            self.translator = MoteXMLTranslator(os.environ['DT_TYPES'])
-        else:
-            self.translator = MoteXMLTranslator('/usr/share/mist-dt-types/dt_types.txt')
+        # The bundled fixture has the types used here, DT_TYPES can point to a full database
+        types = os.environ.get('DT_TYPES', os.path.join(os.path.dirname(__file__), 'dt_types.txt'))
+        self.translator = MoteXMLTranslator(types, backend=self.backend)
 
     def test_packet_1(self):
         """Tests 1st sample packet."""
@@ -78,3 +84,83 @@ class XMLToBytesTester(TestCase):
                           b'901590A090502C809D20800000000000000004A09087B21C8092210F063'
                           b'C751A8D44673AF386DF82A9BB942', 'hex')
         self.assertEqual(result, expected)
+
+    def test_template(self):
+        """A compiled template with a substituted dt_seq encodes to the 2nd sample packet."""
+        etree = ElementTree.fromstring("""<?xml version="1.0" ?>
+            <xml_packet>
+                <dt_data>
+                    <dt_data value="dt_external_temperature_C">
+                        <dt_value value="-27315">
+                            <dt_exp value="-2"/>
+                        </dt_value>
+                    </dt_data>
+                    <dt_data value="dt_battery_V">
+                        <dt_value value="3407">
+                            <dt_exp value="-3"/>
+                        </dt_value>
+                    </dt_data>
+                    <dt_age_ms value="10"/>
+                </dt_data>
+                <dt_subscription value="2">
+                    <dt_provider buffer="0000000000000000"/>
+                    <dt_seq value="8572"/>
+                    <dt_resource buffer="f063c751a8d44673af386df82a9bb942"/>
+                </dt_subscription>
+            </xml_packet>
+        """)
+        plan = self.translator.compile_template(etree, {"seq": "dt_subscription/dt_seq",
+                                                        "provider": "dt_subscription/dt_provider@buffer"})
+        self.assertEqual(plan.encode(), self.translator.translate_from_xml(etree))
+        expected = decode(b'080F4A010FE2004A02044D9549036EFE49010F364A05044F0D49066EFD4'
+                          b'901590A090502C809D20800000000000000004A09087B21C8092210F063'
+                          b'C751A8D44673AF386DF82A9BB942', 'hex')
+        self.assertEqual(plan.encode(seq=8571), expected)
+        self.assertEqual(plan.encode(seq="0x217B", provider=b"\0" * 8), expected)
+        # Field widths that the template did not have
+        etree.find("dt_subscription/dt_seq").set("value", "305419896")
+        self.assertEqual(plan.encode(seq=0x12345678), self.translator.translate_from_xml(etree))
+        self.assertRaises(KeyError, plan.encode, dt_seq=1)
+
+    def test_large_packet(self):
+        """Packets larger than the default encoder buffer are not truncated."""
+        etree = ElementTree.fromstring("<xml_packet>%s</xml_packet>" % ("<dt_data><dt_resource buffer=\"%s\"/></dt_data>" % ("AB" * 100) * 50))
+        result = self.translator.translate_from_xml(etree)
+        self.assertEqual(len(result), 50 * (2 + 4 + 100))
+        self.assertEqual(ElementTree.tostring(self.translator.translate_to_xml(result)), ElementTree.tostring(etree).lower())
+
+    def test_iter_translate(self):
+        """Packets are encoded while the document is parsed, like translate_from_xml would encode them."""
+        packets = ["<xml_packet><dt_subscription value=\"%u\"><dt_seq value=\"%u\"/></dt_subscription></xml_packet>" % (i, i * 1000)
+                   for i in range(10)]
+        packets.insert(3, "<xml_packet><dt_bad/></xml_packet>")
+        packets.insert(5, "<xml_packet>%s</xml_packet>" % ("<dt_resource buffer=\"%s\"/>" % ("00" * 200) * 5))
+        source = io.BytesIO(("<packets>%s</packets>" % "".join(packets)).encode("ascii"))
+        expected = [self.translator.translate_from_xml(ElementTree.fromstring(p)) for p in packets]
+        self.assertIsNone(expected[3])
+        self.assertEqual(list(self.translator.iter_translate_from_xml(source)), expected)
+
+    def test_iter_translate_pool(self):
+        """An empty packet does not leave an undersized encoder for streaming the next ones."""
+        self.assertEqual(self.translator.translate_from_xml(ElementTree.fromstring("<xml_packet/>")), b"")
+        self.assertTrue(all(enc.size >= 512 for enc in self.translator._encoders))
+        packet = "<xml_packet>%s</xml_packet>" % ("<dt_resource buffer=\"%s\"/>" % ("00" * 20) * 50)
+        other = MoteXMLTranslator(backend=self.backend, tagdb=self.translator.tagdb)
+        expected = other.translate_from_xml(ElementTree.fromstring(packet))
+        encode_objects = self.translator._encode_objects
+        calls = []
+        self.translator._encode_objects = lambda *args: calls.append(args) or encode_objects(*args)
+        source = io.BytesIO(("<packets>%s</packets>" % (packet * 3)).encode("ascii"))
+        self.assertEqual(list(self.translator.iter_translate_from_xml(source)), [expected] * 3)
+        self.assertEqual(len(calls), 1)  # Only the first packet overflows the pooled encoder
+
+
+class PythonXMLToBytesTester(XMLToBytesTester):
+    """Test XML input to binary output with the pure-Python backend."""
+    backend = "python"
+
+
+@skipIf(mlctypes is None, "libmlformat is not available")
+class CtypesXMLToBytesTester(XMLToBytesTester):
+    """Test XML input to binary output with the libmlformat backend."""
+    backend = "ctypes"
@@ -1,53 +1,21 @@
 #!/usr/bin/env python
 """gentypes.py: MoteXML header generator."""
-import re
+import logging
 import time
 import getpass
 
+from motexml import tagdb
+
 __author__ = "Raido Pahtma"
 __license__ = "MIT"
 
 
 def read_input(filename):
-    f = open(filename, "r")
-    l = 0
-    db = []
-    for iline in f:
-        l += 1
-        line = iline = iline.lstrip().rstrip()
-        if len(line) > 0:
-
-            # Deal with comments
-            split = line.split("#", 1)
-            if len(split) > 1 and len(split[0]) > 0 and len(split[1]) > 0:
-                line = split[0].rstrip()
-                comment = split[1].lstrip().rstrip()
-            else:
-                line = split[0].rstrip()
-                comment = None
-
-            if len(line) > 0:
-                # Split the line into code and name
-                split = re.findall(r'[\w|%]+', line)
-                if len(split) >= 2:
-                    code = split[0]
-                    name = split[1]
-
-                    if name != "-":
-                        try:
-                            code = int(code, 16)
-                        except Exception:
-                            print("Error: Unable to parse line %u: \"%s\"" % (l, iline))
-                            print(split)
-                            return None
-
-                        db.append((code, name, comment))
-
-                # Name is made up of multiple words, first one will be used
-                if len(split) > 3:
-                    print("Warning: Line %u not formatted correctly: \"%s\"" % (l, iline))
-
-    return db
+    try:
+        return tagdb.read(filename)
+    except ValueError as e:
+        print("Error: %s" % e)
+        return None
 
 
 def write_output(dt_types, filename):
@@ -94,6 +62,8 @@ def main():
 
     args = parser.parse_args()
 
+    logging.basicConfig(format="%(levelname)s: %(message)s")
+
     dt_types = read_input(args.input)
 
     if dt_types is not None:
@@ -3,20 +3,74 @@
 from __future__ import print_function
 
 from codecs import decode
+import io
+import sys
 
+from motexml import framing
 from motexml import motexml
+from motexml.parallel import ParallelTranslator
 
 __author__ = "Raido Pahtma"
 __license__ = "MIT"
 
 
+def _to_xml(translator, data):
+    return motexml.xml_to_string(translator.translate_to_xml(data))
+
+
+def stream(args):
+    """Translate a stream of packets, one XML document per packet."""
+    if args.input == "-":
+        source = sys.stdin.buffer if args.format == "binary" else sys.stdin
+    else:
+        source = io.open(args.input, "rb" if args.format == "binary" else "r")
+
+    if args.format == "binary":
+        packets = framing.read_length_prefixed(source)
+    else:
+        packets = framing.read_hex_lines(source)
+
+    parallel = None
+    try:
+        if args.jobs > 1:
+            parallel = ParallelTranslator(args.types, workers=args.jobs)
+            results = parallel.map(packets, _to_xml)
+        else:
+            translator = motexml.MoteXMLTranslator(args.types)
+            results = (_to_xml(translator, p) for p in packets)
+        for xml in results:
+            sys.stdout.write(xml)
+            sys.stdout.write("\n")
+    except ValueError as e:
+        print("ERROR: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        if parallel is not None:
+            parallel.close()
+        if source not in (sys.stdin, sys.stdin.buffer):
+            source.close()
+    return 0
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="print hex as XML")
-    parser.add_argument("hexdata", default=None, nargs="+", help="Input data")
+    parser.add_argument("hexdata", default=None, nargs="*", help="Input data")
     parser.add_argument("--types", default="/usr/share/mist-dt-types/dt_types.txt", help="dt_types text file")
+    parser.add_argument("--stream", default=False, action="store_true",
+                        help="Translate a stream of packets from --input, one XML document per packet")
+    parser.add_argument("--input", default="-", help="Stream input file, - for stdin")
+    parser.add_argument("--format", default="hex", choices=("hex", "binary"),
+                        help="Stream input format, hex lines or binary packets with a 2 byte big-endian length prefix")
+    parser.add_argument("--jobs", default=1, type=int, help="Number of worker processes for the stream")
     args = parser.parse_args()
 
+    if args.stream:
+        sys.exit(stream(args))
+
+    if not args.hexdata:
+        parser.error("hexdata is required unless --stream is used")
+
     hexdata = "".join(args.hexdata)
 
     print("Hex length = {}".format(len(hexdata) // 2))
@@ -4,9 +4,12 @@ from __future__ import print_function
 
 from codecs import encode
 
+from motexml import framing
 from motexml import motexml
+from motexml.parallel import ParallelTranslator
 
 import os
+import sys
 from datetime import datetime
 
 __author__ = "Raido Pahtma"
@@ -26,15 +29,57 @@ uint8_t {array:}[] = {{{data:}}};
 """
 
 
+def stream(args):
+    """Translate all xml_packet elements of a file, one packet per element."""
+    if args.filename is None or args.filename == "-":
+        source = sys.stdin.buffer
+    else:
+        source = args.filename
+
+    parallel = None
+    try:
+        if args.jobs > 1:
+            parallel = ParallelTranslator(args.types, workers=args.jobs)
+            results = parallel.translate_from_xml(motexml.xml_packets_from_file(source))
+        else:
+            results = motexml.MoteXMLTranslator(args.types).iter_translate_from_xml(source)
+        for num, data in enumerate(results):
+            if data is None:
+                print("ERROR: packet {} translation failed".format(num), file=sys.stderr)
+            elif args.format == "binary":
+                framing.write_length_prefixed(sys.stdout.buffer, data)
+            else:
+                sys.stdout.write(encode(data, "hex").decode("ascii"))
+                sys.stdout.write("\n")
+    except motexml.ETREE_EXCEPTIONS as e:
+        print("ERROR: {}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        if parallel is not None:
+            parallel.close()
+    return 0
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="print hex as XML")
-    parser.add_argument("filename", default=None, help="Input file name")
+    parser.add_argument("filename", default=None, nargs="?", help="Input file name")
     parser.add_argument("--types", default="/usr/share/mist-dt-types/dt_types.txt", help="dt_types text file")
     parser.add_argument("--header", default=None, help="Generate a C header file with the data")
     parser.add_argument("--array", default="data", help="Name of the array in the C header file")
+    parser.add_argument("--stream", default=False, action="store_true",
+                        help="Translate every xml_packet in the input file (- or none for stdin)")
+    parser.add_argument("--format", default="hex", choices=("hex", "binary"),
+                        help="Stream output format, hex lines or binary packets with a 2 byte big-endian length prefix")
+    parser.add_argument("--jobs", default=1, type=int, help="Number of worker processes for the stream")
     args = parser.parse_args()
 
+    if args.stream:
+        sys.exit(stream(args))
+
+    if args.filename is None:
+        parser.error("filename is required unless --stream is used")
+
     trans = motexml.MoteXMLTranslator(args.types)
 
     xd = motexml.xml_from_file(args.filename)
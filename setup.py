@@ -19,6 +19,7 @@ setup(name='motexml',
       author_email='raido.pahtma@ttu.ee',
       license='MIT',
       platforms=['any'],
+      python_requires='>=3.7',
       packages=find_packages(),
       install_requires=[],
       test_suite='nose.collector',